@@ -89,6 +89,10 @@ class Factory(object):
         }
 
     }
+    # API client cache defaults - the cache is shared by every API request in the process
+    API_CLIENT_CACHE_TTL = 900
+    API_CLIENT_CACHE_SIZE = 32
+    _API_CLIENT_CACHE = None
 
 ###############################
 #          MAIN GETs          #
@@ -217,6 +221,9 @@ class Factory(object):
         else:
             cloud_auth = config[cloud_type]
         cloud_comps = cloud_components_list if cloud_components_list else Factory.DEFAULT_CLOUD_COMPONENTS['api'][cloud_type]
+        #-- Cloud and billing clients are reused between requests if the cache is enabled
+        client_cache = Factory._get_api_client_cache(config, log_file, log_level)
+        cached_clients = []
 
         # CREATE CLIENT MAP
         #-- Create Concertim client
@@ -231,7 +238,7 @@ class Factory(object):
             concertim_client = None
         #-- Create Cloud client
         if enable_cloud_client:
-            cloud_client = Factory.get_client(
+            build_cloud_client = lambda: Factory.get_client(
                 'cloud',
                 cloud_auth,
                 log_file,
@@ -240,17 +247,33 @@ class Factory(object):
                 components_list=cloud_comps,
                 billing_enabled=enable_billing_client
             )
+            if client_cache:
+                cloud_client = client_cache.get(
+                    client_cache.make_key('cloud', cloud_type, cloud_auth, sorted(cloud_comps), enable_billing_client),
+                    build_cloud_client
+                )
+                cached_clients.append('cloud')
+            else:
+                cloud_client = build_cloud_client()
         else:
             cloud_client = None
         #-- Create Billing client
         if enable_billing_client:
-            billing_client = Factory.get_client(
+            build_billing_client = lambda: Factory.get_client(
                 'billing',
                 config[billing_app],
                 log_file,
                 log_level,
                 client_subtype=billing_app
             )
+            if client_cache:
+                billing_client = client_cache.get(
+                    client_cache.make_key('billing', billing_app, config[billing_app]),
+                    build_billing_client
+                )
+                cached_clients.append('billing')
+            else:
+                billing_client = build_billing_client()
         else:
             billing_client = None
         handler_clients = {
@@ -263,12 +286,29 @@ class Factory(object):
         handler = APIHandler(
             handler_clients,
             log_file,
-            log_level
+            log_level,
+            cached_clients=cached_clients
         )
 
         # RETURN HANDLER
         return handler
 
+    @staticmethod
+    def _get_api_client_cache(config, log_file, log_level):
+        # Returns None if the cache is disabled with an api_client_cache_ttl of 0
+        ttl = config.get('api_client_cache_ttl', Factory.API_CLIENT_CACHE_TTL)
+        if not ttl:
+            return None
+        if Factory._API_CLIENT_CACHE is None:
+            from conser.utils.client_cache import ClientCache
+            Factory._API_CLIENT_CACHE = ClientCache(
+                config.get('api_client_cache_size', Factory.API_CLIENT_CACHE_SIZE),
+                ttl,
+                log_file,
+                log_level
+            )
+        return Factory._API_CLIENT_CACHE
+
 # BILLING    
     @staticmethod
     def _build_billing_handler(config, log_file, enable_concertim_client, enable_cloud_client, enable_billing_client):
@@ -326,7 +366,8 @@ class Factory(object):
         handler = BillingHandler(
             handler_clients,
             log_file,
-            log_level
+            log_level,
+            full_flush_cycles=config.get('billing_full_flush_cycles')
         )
 
         # RETURN HANDLER
@@ -499,7 +540,9 @@ class Factory(object):
         handler = SyncHandler(
             handler_clients,
             log_file,
-            log_level
+            log_level,
+            fetch_workers=config.get('sync_fetch_workers'),
+            full_sync_interval=config.get('sync_full_interval')
         )
 
         # RETURN HANDLER
@@ -40,6 +40,8 @@ from dateutil.parser import parse as dt_parse
 # Py Packages
 import sys
 import json
+import time
+import threading
 from datetime import datetime, timedelta
 # Disable insecure warnings
 import requests
@@ -52,6 +54,10 @@ class KillbillClient(AbsBillingClient):
     BILLING_CREDIT_THRESHOLD=25
     BILLING_CYCLE_DAYS=31
     BILLING_CURRENCY='USD'
+    # Seconds a loaded custom field index is used for lookups before it is reloaded
+    BILLING_INDEX_TTL=300
+    # Custom fields fetched per page when loading the index
+    CUSTOM_FIELD_PAGE_SIZE=500
     CLUSTER_BILLING_ID_FIELD = 'openstack_stack_id'
     PROJECT_BILLING_ID_FIELD = 'project_cloud_id'
     CUSTOM_FIELD_FUNCTIONS = {
@@ -84,6 +90,14 @@ class KillbillClient(AbsBillingClient):
             self._credit_threshold = float(self._CONFIG['credit_threshold'])
         else:
             self._credit_threshold = float(KillbillClient.BILLING_CREDIT_THRESHOLD)
+        if 'index_ttl' in self._CONFIG and self._CONFIG['index_ttl'] is not None:
+            self._index_ttl = float(self._CONFIG['index_ttl'])
+        else:
+            self._index_ttl = float(KillbillClient.BILLING_INDEX_TTL)
+        # Custom field index - {'expiry':, 'subscriptions': {cluster_cloud_id: [sub_id]}, 'accounts': {project_cloud_id: [acct_id]}}
+        # A cloud ID missing from the index is always searched for in Kill Bill
+        self._billing_index = None
+        self._billing_index_lock = threading.Lock()
         self.__LOGGER.info("SUCCESS - KillbillClient Created")
 
     ############################################
@@ -132,6 +146,7 @@ class KillbillClient(AbsBillingClient):
             field_name=KillbillClient.PROJECT_BILLING_ID_FIELD,
             field_value=project_cloud_id
         )
+        self._invalidate_billing_index()
 
         # BUILD RETURN DICT
         self.__LOGGER.debug(f"Building Return dictionary")
@@ -183,6 +198,7 @@ class KillbillClient(AbsBillingClient):
             }
         #-- Get subscription ID
         sub_id = resp_dict['headers']['Location'].split('/')[-1]
+        self._invalidate_billing_index()
 
         # BUILD RETURN DICT
         self.__LOGGER.debug(f"Building Return dictionary")
@@ -356,6 +372,7 @@ class KillbillClient(AbsBillingClient):
             created_by='KillbillClient'
         )
         resp_dict = self._get_dict_from_resp(resp)
+        self._invalidate_billing_index()
 
         # BUILD RETURN DICT
         self.__LOGGER.debug(f"Building Return dictionary")
@@ -452,23 +469,29 @@ class KillbillClient(AbsBillingClient):
             raise EXCP.MissingRequiredArgs('cluster_cloud_id')
 
         # BILLING OBJECT LOGIC
-        resp = self.apis['custom_field'].search_custom_fields_with_http_info(
-            search_key=cluster_cloud_id
-        )
-        resp_dict = self._get_dict_from_resp(resp)
+        #-- Use the index if it is loaded and has the cluster, else search the custom fields
+        sub_ids = self._get_indexed('subscriptions', cluster_cloud_id)
+        if sub_ids is None:
+            resp = self.apis['custom_field'].search_custom_fields_with_http_info(
+                search_key=cluster_cloud_id
+            )
+            resp_dict = self._get_dict_from_resp(resp)
+            sub_ids = [
+                cf.object_id for cf in resp_dict['data']
+                if cf.object_type == "SUBSCRIPTION" and cf.name == KillbillClient.CLUSTER_BILLING_ID_FIELD
+            ]
+            self._set_indexed('subscriptions', cluster_cloud_id, sub_ids)
         matches = {
             'count': 0,
             'subscriptions': {}
         }
-        for cf in resp_dict['data']:
-            if cf.object_type != "SUBSCRIPTION" or cf.name != KillbillClient.CLUSTER_BILLING_ID_FIELD:
-                continue
+        for sub_id in sub_ids:
             sub = self.get_cluster_billing_info(
-                cluster_billing_id=cf.object_id
+                cluster_billing_id=sub_id
             )
             if sub['order']['state'] != "ACTIVE":
                 continue
-            matches['subscriptions'][cf.object_id] = sub['order']
+            matches['subscriptions'][sub_id] = sub['order']
             matches['count'] += 1
         self.__LOGGER.debug(f"Returning Matches : {matches}")
         return matches
@@ -485,23 +508,29 @@ class KillbillClient(AbsBillingClient):
             raise EXCP.MissingRequiredArgs('project_cloud_id')
 
         # BILLING OBJECT LOGIC
-        resp = self.apis['custom_field'].search_custom_fields_with_http_info(
-            search_key=project_cloud_id
-        )
-        resp_dict = self._get_dict_from_resp(resp)
+        #-- Use the index if it is loaded and has the project, else search the custom fields
+        acct_ids = self._get_indexed('accounts', project_cloud_id)
+        if acct_ids is None:
+            resp = self.apis['custom_field'].search_custom_fields_with_http_info(
+                search_key=project_cloud_id
+            )
+            resp_dict = self._get_dict_from_resp(resp)
+            acct_ids = [
+                cf.object_id for cf in resp_dict['data']
+                if cf.object_type == "ACCOUNT" and cf.name == KillbillClient.PROJECT_BILLING_ID_FIELD
+            ]
+            self._set_indexed('accounts', project_cloud_id, acct_ids)
         matches = {
             'count': 0,
             'accounts': {}
         }
-        for cf in resp_dict['data']:
-            if cf.object_type != "ACCOUNT" or cf.name != KillbillClient.PROJECT_BILLING_ID_FIELD:
-                continue
+        for acct_id in acct_ids:
             acct = self.get_account_billing_info(
-                project_billing_id=cf.object_id
+                project_billing_id=acct_id
             )
-            if acct.state != "ACTIVE":
+            if acct['state'] != "ACTIVE":
                 continue
-            matches['accounts'][cf.object_id] = acct
+            matches['accounts'][acct_id] = acct
             matches['count'] += 1
         self.__LOGGER.debug(f"Returning Matches : {matches}")
         return matches
@@ -568,6 +597,51 @@ class KillbillClient(AbsBillingClient):
         # RETURN
         return return_dict
 
+    def load_billing_index(self, force=False):
+        """
+        Load the index of cloud IDs to subscription/account IDs used by the lookup functions,
+        unless the loaded index has not expired yet.
+
+        The index is built from the custom fields alone, listed in pages, so a lookup does not
+        need to search them. The matched subscriptions/accounts are still fetched on lookup,
+        to only return ACTIVE ones.
+        """
+        # EXIT CASES
+        if not self.apis['custom_field']:
+            raise EXCP.NoComponentFound('CustomFieldAPI')
+        if self._index_ttl <= 0:
+            return
+        with self._billing_index_lock:
+            if not force and self._billing_index is not None and self._billing_index['expiry'] >= time.monotonic():
+                return
+        self.__LOGGER.debug(f"Loading custom field index")
+
+        # BILLING OBJECT LOGIC
+        index = {
+            'subscriptions': {},
+            'accounts': {}
+        }
+        offset = 0
+        while True:
+            resp = self.apis['custom_field'].get_custom_fields_with_http_info(
+                offset=offset,
+                limit=KillbillClient.CUSTOM_FIELD_PAGE_SIZE
+            )
+            resp_dict = self._get_dict_from_resp(resp)
+            page = resp_dict['data'] or []
+            for cf in page:
+                if cf.object_type == "SUBSCRIPTION" and cf.name == KillbillClient.CLUSTER_BILLING_ID_FIELD:
+                    index['subscriptions'].setdefault(cf.value, []).append(cf.object_id)
+                elif cf.object_type == "ACCOUNT" and cf.name == KillbillClient.PROJECT_BILLING_ID_FIELD:
+                    index['accounts'].setdefault(cf.value, []).append(cf.object_id)
+            if len(page) < KillbillClient.CUSTOM_FIELD_PAGE_SIZE:
+                break
+            offset += len(page)
+        index['expiry'] = time.monotonic() + self._index_ttl
+        with self._billing_index_lock:
+            self._billing_index = index
+        self.__LOGGER.debug(f"Loaded custom field index - {len(index['subscriptions'])} clusters - {len(index['accounts'])} projects")
+
     def update_account_billing_info(self, project_billing_id, new_email=None):
         """
         Function to update an Account's info in the billing app. Email, password, etc.
@@ -771,6 +845,7 @@ class KillbillClient(AbsBillingClient):
             field_name=tag_name,
             field_value=tag_value
         )
+        self._invalidate_billing_index()
 
         # BUILD RETURN DICT
         self.__LOGGER.debug(f"Building Return dictionary")
@@ -825,6 +900,30 @@ class KillbillClient(AbsBillingClient):
         }
         return resp_dict
 
+    def _get_indexed(self, index_type, cloud_id):
+        # Return the indexed object IDs for the cloud ID, or None if the custom fields must be searched
+        with self._billing_index_lock:
+            if self._billing_index is None:
+                return None
+            if self._billing_index['expiry'] < time.monotonic():
+                self._billing_index = None
+                return None
+            if cloud_id not in self._billing_index[index_type]:
+                return None
+            return list(self._billing_index[index_type][cloud_id])
+
+    def _set_indexed(self, index_type, cloud_id, object_ids):
+        # Add a searched cloud ID to a loaded index - IDs with no match are not stored
+        if not object_ids:
+            return
+        with self._billing_index_lock:
+            if self._billing_index is not None:
+                self._billing_index[index_type][cloud_id] = list(object_ids)
+
+    def _invalidate_billing_index(self):
+        with self._billing_index_lock:
+            self._billing_index = None
+
     def _add_custom_field(self, obj_type, obj_id, field_name, field_value):
         self.__LOGGER.debug(f"Adding custom field {field_name} to {obj_type}.{obj_id}")
         if obj_type not in KillbillClient.CUSTOM_FIELD_FUNCTIONS['add']:
@@ -35,6 +35,9 @@ import conser.exceptions as EXCP
 
 # Py Packages
 import sys
+import threading
+import time
+from datetime import timedelta, datetime, timezone
 
 # Openstack Exceptions
 import novaclient.exceptions as NEXCP
@@ -55,6 +58,14 @@ class OpenstackClient(AbsCloudClient):
             'throughput': 'calc_throughput',
             'iops': 'calc_iops'
         },
+        # Gnocchi (metric name, aggregation) pairs used by each metric in get_all_metrics
+        'metric_measures': {
+            'cpu_load': [('cpu', 'rate:mean')],
+            'ram_usage': [('memory.usage', 'mean')],
+            'network_usage': [('network.incoming.bytes', 'rate:mean'), ('network.outgoing.bytes', 'rate:mean')],
+            'throughput': [('disk.device.read.bytes', 'rate:mean'), ('disk.device.write.bytes', 'rate:mean')],
+            'iops': [('disk.device.read.requests', 'rate:mean'), ('disk.device.write.requests', 'rate:mean')]
+        },
         'resource_map': {
             'server': {
                 'resource_ids': {
@@ -72,6 +83,14 @@ class OpenstackClient(AbsCloudClient):
             }
         }
     }
+    # Max number of resources covered by one set of bulk metric queries
+    BULK_METRICS_CHUNK_SIZE = 100
+    # How far back (seconds) to look for the static memory size measure in bulk metric queries
+    BULK_MEMORY_LOOKBACK = 3600
+    # How long (seconds) resolved gnocchi metric IDs and memory sizes are reused before re-checking
+    METRICS_CACHE_TTL = 3600
+    # Stack resources cache entry for a stack that could not be found
+    MISSING_STACK = object()
     SUPPORTED_COST_GROUPS = {
         'project': {
             'id_field': 'project_id'
@@ -111,6 +130,12 @@ class OpenstackClient(AbsCloudClient):
         self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
         self.__LOGGER.info("CREATING OPENSTACK CLIENT")
         self.req_keystone_objs = None 
+        # Heat resource tree cache - only used between start_/stop_stack_resources_cache calls
+        self._stack_resources_cache = None
+        self._stack_resources_lock = threading.Lock()
+        # Gnocchi metric cache - {resource_id: (expiry, value)}
+        self._metric_ids_cache = {}
+        self._memory_size_cache = {}
         if required_ks_objs:
             self.req_keystone_objs = self.__populate_required_objs('keystone', required_ks_objs)
         self.CONCERTIM_STATE_MAP = {
@@ -360,11 +385,14 @@ class OpenstackClient(AbsCloudClient):
             if 'memory.usage' not in resource_dict['metrics']:
                 raise EXCP.MissingResourceMetric('memory.usage')
             try:
-                memory = self.components['gnocchi'].get_metric_measure(
-                    metric=resource_dict['metrics']['memory'],
-                    refresh=False,
-                    limit=1
-                )[-1][2]
+                memory = self._get_cached(self._memory_size_cache, resource_id)
+                if memory is None:
+                    memory = self.components['gnocchi'].get_metric_measure(
+                        metric=resource_dict['metrics']['memory'],
+                        refresh=False,
+                        limit=1
+                    )[-1][2]
+                    self._set_cached(self._memory_size_cache, resource_id, memory)
                 memory_usage = self.components['gnocchi'].get_metric_measure(
                     metric=resource_dict['metrics']['memory.usage'],
                     aggregation='mean',
@@ -456,20 +484,26 @@ class OpenstackClient(AbsCloudClient):
                 return 0.0, False
         
         #-- GET RESOURCES
-        #---- Loop over mapping and get metric ids for the resource type
-        for r_type, id_field in OpenstackClient.SUPPORTED_METRIC_GROUPS['resource_map'][resource_type]['resource_ids'].items():
-            self.__LOGGER.debug(f"Getting metrics for resource: {r_type}.{id_field}.{resource_id}")
-            r_dict = self.components['gnocchi'].search_resource(
-                query={"=":{id_field: resource_id}},
-                resource_type=r_type,
-                details=True
-            )
-            if r_dict:
-                r_dict = r_dict[0]
-            if 'metrics' not in r_dict:
-                raise EXCP.MissingResourceMetric(f"{r_type}:{id_field}:{resource_id}")
-            # Merge the metrics dicts
-            resource_dict['metrics'] = {**resource_dict['metrics'], **r_dict['metrics']}
+        #---- Metric ids for the resource type - from the cache if still valid
+        cached_metrics = self._get_cached(self._metric_ids_cache, resource_id)
+        if cached_metrics is not None:
+            resource_dict['metrics'] = cached_metrics
+        else:
+            #---- Loop over mapping and get metric ids for the resource type
+            for r_type, id_field in OpenstackClient.SUPPORTED_METRIC_GROUPS['resource_map'][resource_type]['resource_ids'].items():
+                self.__LOGGER.debug(f"Getting metrics for resource: {r_type}.{id_field}.{resource_id}")
+                r_dict = self.components['gnocchi'].search_resource(
+                    query={"=":{id_field: resource_id}},
+                    resource_type=r_type,
+                    details=True
+                )
+                if r_dict:
+                    r_dict = r_dict[0]
+                if 'metrics' not in r_dict:
+                    raise EXCP.MissingResourceMetric(f"{r_type}:{id_field}:{resource_id}")
+                # Merge the metrics dicts
+                resource_dict['metrics'] = {**resource_dict['metrics'], **r_dict['metrics']}
+            self._set_cached(self._metric_ids_cache, resource_id, resource_dict['metrics'])
 
         #-- Call internal calculation functions to build metric_vals
         metric_vals = {}
@@ -492,6 +526,57 @@ class OpenstackClient(AbsCloudClient):
         # RETURN
         return metric_vals
 
+    def get_all_metrics(self, resource_type, resource_ids, start, stop):
+        """
+        Get all metrics for many resources of the same type using bulk Gnocchi queries.
+
+        Metric IDs for every resource are found with one resource search per resource
+        type in SUPPORTED_METRIC_GROUPS['resource_map'], then the measures for all of them
+        are fetched in a single aggregates call (per BULK_METRICS_CHUNK_SIZE resources).
+
+        resource_ids : list of the IDs of the resources in the cloud
+        resource_type, start, stop : same as get_metrics
+
+        return_dict = {
+            <resource_id>: <metric_vals in the same format as get_metrics>
+        }
+        Resources with no Gnocchi resource are left out of the return dict.
+        """
+        # EXIT CASES
+        if 'gnocchi' not in self.components or not self.components['gnocchi']:
+            raise EXCP.NoComponentFound('gnocchi')
+        if resource_type not in OpenstackClient.SUPPORTED_METRIC_GROUPS['resource_map']:
+            raise EXCP.InvalidArguments(f"resource_type:{resource_type}")
+        if not start:
+            raise EXCP.MissingRequiredArgs(f"start")
+        if not stop:
+            raise EXCP.MissingRequiredArgs(f"stop")
+
+        # CLOUD OBJECT LOGIC
+        resource_ids = list(dict.fromkeys(r_id for r_id in resource_ids if r_id))
+        return_dict = {}
+        chunk_size = OpenstackClient.BULK_METRICS_CHUNK_SIZE
+        for i in range(0, len(resource_ids), chunk_size):
+            return_dict.update(self._get_metrics_chunk(resource_type, resource_ids[i:i + chunk_size], start, stop))
+
+        # RETURN
+        return return_dict
+
+    def invalidate_metrics_cache(self, resource_ids=None):
+        """
+        Drop cached gnocchi metric IDs and memory sizes for the given resources,
+        or for all resources if none are given.
+        """
+        if resource_ids is None:
+            self.__LOGGER.debug(f"Clearing metrics cache")
+            self._metric_ids_cache.clear()
+            self._memory_size_cache.clear()
+            return
+        for r_id in resource_ids:
+            self.__LOGGER.debug(f"Invalidating metrics cache for {r_id}")
+            self._metric_ids_cache.pop(r_id, None)
+            self._memory_size_cache.pop(r_id, None)
+
     def get_user_info(self, user_cloud_id):
         """
         Get a user's cloud info
@@ -747,6 +832,67 @@ class OpenstackClient(AbsCloudClient):
         # RETURN
         return return_dict
 
+    def get_all_costs(self, start, stop):
+        """
+        Get the cost data for every server and project in one rating summary query
+
+        returns a dict in the format
+        return_dict = {
+            'server': {
+                <server_cloud_id>: {'total_cost': , 'detailed_cost': {<charge_type>: cost}}
+            },
+            'project': {
+                <project_cloud_id>: {'total_cost': , 'detailed_cost': {<charge_type>: cost}}
+            }
+        }
+        Objects without any rated usage are not included.
+        """
+        self.__LOGGER.debug(f"Fetching cost for all objects starting at {start} and ending at {stop}")
+        # EXIT CASES
+        if 'cloudkitty' not in self.components or not self.components['cloudkitty']:
+            raise EXCP.NoComponentFound('cloudkitty')
+        if not start:
+            raise EXCP.MissingRequiredArgs(f"start")
+        if not stop:
+            raise EXCP.MissingRequiredArgs(f"stop")
+
+        # CLOUD OBJECT LOGIC
+        project_field = OpenstackClient.SUPPORTED_COST_GROUPS['project']['id_field']
+        server_field = OpenstackClient.SUPPORTED_COST_GROUPS['server']['id_field']
+        summary = self.components['cloudkitty'].get_rating_summary_grouped(
+            groupby=[project_field, server_field, 'type'],
+            begin=start,
+            end=stop
+        )
+        return_dict = {
+            'server': {},
+            'project': {}
+        }
+        if not summary['results']:
+            return return_dict
+        columns = summary['columns']
+        project_index = columns.index(project_field)
+        server_index = columns.index(server_field)
+        type_index = columns.index('type')
+        rate_index = columns.index('rate')
+        for row in summary['results']:
+            res_type = row[type_index]
+            cost = row[rate_index]
+            for obj_type, obj_cloud_id in (('project', row[project_index]), ('server', row[server_index])):
+                if not obj_cloud_id:
+                    continue
+                obj_cost = return_dict[obj_type].get(obj_cloud_id)
+                if obj_cost is None:
+                    obj_cost = return_dict[obj_type][obj_cloud_id] = {'total_cost': 0.0, 'detailed_cost': {}}
+                obj_cost['total_cost'] += float(cost)
+                if res_type not in obj_cost['detailed_cost']:
+                    obj_cost['detailed_cost'][res_type] = cost
+                else:
+                    obj_cost['detailed_cost'][res_type] += cost
+
+        # RETURN
+        return return_dict
+
     def get_keypair(self, key_cloud_id, user_cloud_id=None):
         """
         Get keypair info for a given User's/Account's keypair.
@@ -927,7 +1073,7 @@ class OpenstackClient(AbsCloudClient):
             'other': {}
         }
         self.__LOGGER.debug(f"Getting Cluster resource data")
-        resources_list = self.components['heat'].list_stack_resources(
+        resources_list = self._list_stack_resources(
             stack_id=cluster_cloud_id
         )
         for resource in resources_list:
@@ -966,9 +1112,9 @@ class OpenstackClient(AbsCloudClient):
                     'name': resource._info['resource_name']
                 }
             elif res_type[1] == "Heat" and res_type[2] == "ResourceGroup":
-                group_entries = self.components['heat'].list_stack_resources(stack_id=resource.physical_resource_id)
+                group_entries = self._list_stack_resources(stack_id=resource.physical_resource_id)
                 for entry in group_entries:
-                    devices = self.components['heat'].list_stack_resources(stack_id=entry.physical_resource_id)
+                    devices = self._list_stack_resources(stack_id=entry.physical_resource_id)
                     for d in devices:
                         if d.resource_type == "OS::Nova::Server":
                             resources['servers'][d.physical_resource_id] = {
@@ -1020,7 +1166,199 @@ class OpenstackClient(AbsCloudClient):
         if 'heat' not in self.components or not self.components['heat']:
             raise EXCP.NoComponentFound('heat')
         self.__LOGGER.debug(f"Fetching all resources for stack {stack_id}")
-        resources = self.components['heat'].list_stack_resources(stack_id=stack_id)
+        resources = self._list_stack_resources(stack_id=stack_id)
+        return resources
+
+    def start_stack_resources_cache(self):
+        """
+        Start (or restart) caching Heat stack resource lists by stack ID.
+
+        While the cache is active each stack's resources are only listed once,
+        so callers walking the same stacks (get_cluster_info, get_all_stack_resources)
+        share the results. Used for the duration of a single sync cycle.
+        """
+        with self._stack_resources_lock:
+            self._stack_resources_cache = {}
+
+    def stop_stack_resources_cache(self):
+        """
+        Stop caching Heat stack resource lists and drop all cached entries.
+        """
+        with self._stack_resources_lock:
+            self._stack_resources_cache = None
+
+    def _get_metrics_chunk(self, resource_type, resource_ids, start, stop):
+        granularity = OpenstackClient.DEFAULT_GRANULARITY
+        metric_groups = OpenstackClient.SUPPORTED_METRIC_GROUPS
+        #-- Metric IDs by metric name for each resource
+        resources_metrics = self._search_resources_metric_ids(resource_type, resource_ids)
+        #-- Measures for every metric in one call
+        metric_aggregations = set()
+        for metrics in resources_metrics.values():
+            for metric_type in metric_groups['resource_map'][resource_type]['metrics_list']:
+                for metric_name, aggregation in metric_groups['metric_measures'][metric_type]:
+                    if metric_name in metrics:
+                        metric_aggregations.add((metrics[metric_name], aggregation))
+        measures = {}
+        if metric_aggregations:
+            measures = self.components['gnocchi'].get_metrics_measures(
+                sorted(metric_aggregations),
+                granularity=granularity,
+                start=start,
+                stop=stop
+            )
+        #-- Memory size is static, so take the latest value from a longer window
+        memory_sizes = self._get_memory_sizes(
+            {r_id: metrics['memory'] for r_id, metrics in resources_metrics.items() if 'memory' in metrics},
+            stop
+        )
+
+        def last_value(metric_id, aggregation):
+            points = measures.get(metric_id, {}).get(aggregation, [])
+            return points[-1][2] if points else None
+
+        # BUILD RETURN DICT
+        return_dict = {}
+        for r_id, metrics in resources_metrics.items():
+            metric_vals = {}
+            for metric_type, unit in metric_groups['resource_map'][resource_type]['metrics_list'].items():
+                value = 0.0
+                needed = metric_groups['metric_measures'][metric_type]
+                missing = [metric_name for metric_name, aggregation in needed if metric_name not in metrics]
+                if missing:
+                    self.__LOGGER.warning(f"Missing metrics {missing} for {r_id} when calculating {metric_type}")
+                else:
+                    values = [last_value(metrics[metric_name], aggregation) for metric_name, aggregation in needed]
+                    calculated = None
+                    if None not in values:
+                        calculated = self._calc_metric_value(metric_type, values, memory_sizes.get(r_id), granularity)
+                    if calculated is None:
+                        self.__LOGGER.warning(f"A metric returned an empty result when calculating {metric_type} for {r_id}")
+                    else:
+                        value = calculated
+                metric_vals[metric_type] = {
+                    'value': value,
+                    'unit': unit
+                }
+            return_dict[r_id] = metric_vals
+        return return_dict
+
+    def _search_resources_metric_ids(self, resource_type, resource_ids):
+        """
+        Return {<resource_id>: {<metric_name>: <metric_id>}} for the given resources.
+        As in get_metrics, only the first matching gnocchi resource of each type is used.
+        Only resources missing from the metric ID cache are searched for.
+        """
+        resources_metrics = {}
+        to_search = []
+        for r_id in resource_ids:
+            cached_metrics = self._get_cached(self._metric_ids_cache, r_id)
+            if cached_metrics is not None:
+                resources_metrics[r_id] = cached_metrics
+            else:
+                to_search.append(r_id)
+        if not to_search:
+            return resources_metrics
+        r_types = OpenstackClient.SUPPORTED_METRIC_GROUPS['resource_map'][resource_type]['resource_ids']
+        found_types = {}
+        for r_type, id_field in r_types.items():
+            self.__LOGGER.debug(f"Getting metrics for {len(to_search)} resources: {r_type}.{id_field}")
+            r_list = self.components['gnocchi'].search_resource(
+                query={"in": {id_field: to_search}},
+                resource_type=r_type,
+                details=True
+            )
+            seen = set()
+            for r_dict in r_list:
+                r_id = r_dict.get(id_field)
+                if r_id in seen or 'metrics' not in r_dict:
+                    continue
+                seen.add(r_id)
+                found_types[r_id] = found_types.get(r_id, 0) + 1
+                # Merge the metrics dicts
+                resources_metrics[r_id] = {**resources_metrics.get(r_id, {}), **r_dict['metrics']}
+        for r_id in to_search:
+            if r_id not in resources_metrics:
+                self.__LOGGER.warning(f"No metric resources found for {resource_type} {r_id} - skipping")
+            elif found_types[r_id] == len(r_types):
+                #-- Only cache complete results, new resources may still be getting their metrics
+                self._set_cached(self._metric_ids_cache, r_id, resources_metrics[r_id])
+        return resources_metrics
+
+    def _get_memory_sizes(self, memory_metric_ids, stop):
+        """
+        Return {<resource_id>: <memory size>} for the given {<resource_id>: <memory metric id>}
+        """
+        memory_sizes = {}
+        for r_id in list(memory_metric_ids):
+            cached_size = self._get_cached(self._memory_size_cache, r_id)
+            if cached_size is not None:
+                memory_sizes[r_id] = cached_size
+        memory_metric_ids = {r_id: metric_id for r_id, metric_id in memory_metric_ids.items() if r_id not in memory_sizes}
+        if not memory_metric_ids:
+            return memory_sizes
+        measures = self.components['gnocchi'].get_metrics_measures(
+            [(metric_id, 'mean') for metric_id in memory_metric_ids.values()],
+            start=stop - timedelta(seconds=OpenstackClient.BULK_MEMORY_LOOKBACK),
+            stop=stop
+        )
+        for r_id, metric_id in memory_metric_ids.items():
+            points = measures.get(metric_id, {}).get('mean', [])
+            if not points:
+                #-- Nothing recorded in the lookback window - fall back to the first stored measure
+                points = self.components['gnocchi'].get_metric_measure(
+                    metric=metric_id,
+                    refresh=False,
+                    limit=1
+                )
+            if points:
+                memory_sizes[r_id] = points[-1][2]
+                self._set_cached(self._memory_size_cache, r_id, memory_sizes[r_id])
+        return memory_sizes
+
+    def _get_cached(self, cache, key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del cache[key]
+            return None
+        return entry[1]
+
+    def _set_cached(self, cache, key, value):
+        cache[key] = (time.monotonic() + OpenstackClient.METRICS_CACHE_TTL, value)
+
+    def _calc_metric_value(self, metric_type, values, memory_size, granularity):
+        if metric_type == 'cpu_load':
+            return round(values[0] / (1000000000.0 * granularity) * 100, 2)
+        if metric_type == 'ram_usage':
+            if not memory_size:
+                return None
+            return values[0] / memory_size * 100
+        return sum(values) / granularity
+
+    def _list_stack_resources(self, stack_id):
+        if 'heat' not in self.components or not self.components['heat']:
+            raise EXCP.NoComponentFound('heat')
+        with self._stack_resources_lock:
+            cache = self._stack_resources_cache
+            cached = cache.get(stack_id) if cache is not None else None
+        if cached is not None:
+            #-- Missing stacks are cached too, so they are not looked up again this cycle
+            #-- a new exception is raised for each lookup, as callers may be on different threads
+            if cached is OpenstackClient.MISSING_STACK:
+                raise EXCP.MissingCloudObject(f"{stack_id}")
+            return cached
+        try:
+            resources = list(self.components['heat'].list_stack_resources(stack_id=stack_id))
+        except EXCP.MissingCloudObject as e:
+            if cache is not None:
+                with self._stack_resources_lock:
+                    cache[stack_id] = OpenstackClient.MISSING_STACK
+            raise e
+        if cache is not None:
+            with self._stack_resources_lock:
+                cache[stack_id] = resources
         return resources
 
     def get_volume_info(self, volume_id):
@@ -1141,6 +1479,40 @@ class OpenstackClient(AbsCloudClient):
         # RETURN
         return return_dict
 
+    def get_all_cluster_ids(self, project_cloud_id=None):
+        """
+        Get the IDs of all clusters - optionally for a given Project/Account - without
+        fetching each cluster's info.
+
+        return_dict = {
+            'clusters': {
+                <cluster_id>: <project_cloud_id>
+            }
+        }
+        """
+        msg = "Fetching all Cluster IDs"
+        if project_cloud_id:
+            msg += f" for project {project_cloud_id}"
+        self.__LOGGER.debug(msg)
+        # EXIT CASES
+        if 'heat' not in self.components or not self.components['heat']:
+            raise EXCP.NoComponentFound('heat')
+
+        # CLOUD OBJECT LOGIC
+        all_stacks = self.components['heat'].list_stacks()
+
+        # BUILD RETURN DICT
+        return_dict = {
+            'clusters': {}
+        }
+        for stack in all_stacks:
+            if project_cloud_id and stack.project != project_cloud_id:
+                continue
+            return_dict['clusters'][stack.id] = stack.project
+
+        # RETURN
+        return return_dict
+
     def get_all_flavors(self):
         """
         Get all available flavors for servers in the Cloud.
@@ -1510,6 +1882,18 @@ class OpenstackClient(AbsCloudClient):
         # RETURN
         return results
 
+    def get_token_ttl(self):
+        """
+        Return the seconds left before the session's auth token expires,
+        or None if the session has not authenticated yet.
+        """
+        for comp in self.components.values():
+            sess = getattr(comp, '_SESSION', None)
+            auth_ref = getattr(getattr(sess, 'auth', None), 'auth_ref', None)
+            if auth_ref is not None and auth_ref.expires:
+                return (auth_ref.expires - datetime.now(timezone.utc)).total_seconds()
+        return None
+
     def start_message_queue(self):
         """
         Start listening to the message queue and intercepting messages
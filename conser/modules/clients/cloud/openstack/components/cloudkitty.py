@@ -37,8 +37,35 @@ import logging
 # Openstack Packages
 from cloudkittyclient import client as ck_client
 
+
+def group_rating_summary_by_tenant(rating_summary, tenants):
+    """
+    Return {tenant: [usage rows]} for the given tenants from an all-tenant rating summary.
+
+    The rows are grouped by tenant_id in one pass, then picked out for each
+    requested tenant - rows keep their summary order within each tenant.
+    """
+    wanted = {str(tenant) for tenant in tenants}
+    rows_by_tenant = {}
+    for usage in rating_summary:
+        tenant_id = usage["tenant_id"]
+        if tenant_id in wanted:
+            rows = rows_by_tenant.get(tenant_id)
+            if rows is None:
+                rows_by_tenant[tenant_id] = [usage]
+            else:
+                rows.append(usage)
+    grouped = {}
+    for tenant in tenants:
+        rows = rows_by_tenant.get(str(tenant))
+        if rows:
+            grouped.setdefault(str(tenant), []).extend(rows)
+    return grouped
+
     
 class CloudkittyComponent(OpstkBaseComponent):
+    # Max rows requested per page of a summary
+    SUMMARY_PAGE_SIZE = 1000
 
     def __init__(self, sess, log_file, log_level):
         super().__init__(sess, log_file, log_level)
@@ -71,22 +98,43 @@ class CloudkittyComponent(OpstkBaseComponent):
                 all_tenants=True, groupby=["tenant_id", "res_type"]
             )["summary"]
             self.__LOGGER.debug("rating_summary_dict: %s", rating_summary_dict)
-            for tenant in tenants:
-                for usage in rating_summary_dict:
-                    if usage["tenant_id"] == str(tenant):
-                        self.__LOGGER.debug(
-                            "building usage: %s for tenant: %s", usage, str(tenant)
-                        )
-                        if str(tenant) in all_tenants_rating_summary:
-                            all_tenants_rating_summary[str(tenant)].append(usage)
-                        else:
-                            all_tenants_rating_summary[str(tenant)] = [usage]
+            all_tenants_rating_summary = group_rating_summary_by_tenant(rating_summary_dict, tenants)
             self.__LOGGER.debug("all_tenants_rating_summary: %s", all_tenants_rating_summary)
             return all_tenants_rating_summary
         except Exception as e:
             self.__LOGGER.error("Error getting rating summary: %s", e)
             raise e
 
+    def get_rating_summary_grouped(self, groupby, begin, end):
+        """
+        Get the rating summary for all tenants grouped by the given fields, fetching every page.
+
+        Returns a dict in the format
+        {
+            'columns': [<groupby fields and summary fields (including 'rate')>],
+            'results': [[<values in column order>]]
+        }
+        """
+        self.__LOGGER.debug(f"Getting rating summary for all tenants grouped by {groupby}")
+        columns = []
+        results = []
+        try:
+            while True:
+                page = self.cloudkitty_client.summary.get_summary(
+                    all_tenants=True, groupby=groupby, begin=begin, end=end,
+                    offset=len(results), limit=CloudkittyComponent.SUMMARY_PAGE_SIZE
+                )
+                columns = page.get("columns", columns)
+                page_results = page.get("results", [])
+                results.extend(page_results)
+                if not page_results or len(results) >= page.get("total", 0):
+                    break
+            self.__LOGGER.debug(f"Fetched {len(results)} rating summary rows")
+            return {'columns': columns, 'results': results}
+        except Exception as e:
+            self.__LOGGER.error("Error getting grouped rating summary: %s", e)
+            raise e
+
     def get_rating_summary(self, obj_id_field, obj_id, begin, end):
         if obj_id:
             self.__LOGGER.debug("Getting rating summary for resource " + obj_id)
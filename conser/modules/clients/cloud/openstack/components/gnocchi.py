@@ -38,6 +38,9 @@ import gnocchiclient.v1.client as g_client
 #import gnocchiclient.exceptions
 
 class GnocchiComponent(OpstkBaseComponent):
+    # Errors caused by single metrics in an aggregates call - the call is split to find them
+    SPLITTABLE_ERROR_CODES = (400, 404)
+
     def __init__(self, sess, log_file, log_level):
         super().__init__(sess, log_file, log_level)
         self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
@@ -77,6 +80,39 @@ class GnocchiComponent(OpstkBaseComponent):
             self.__LOGGER.warning(f"Returning empty list due to [{type(e).__name__}]")
             return []
 
+    def get_metrics_measures(self, metric_aggregations, granularity=None, start=None, stop=None):
+        """
+        Get measures for many metrics in one aggregates call.
+
+        metric_aggregations : list of (metric_id, aggregation) tuples
+
+        returns a dict in the format {<metric_id>: {<aggregation>: [measures]}}
+
+        Gnocchi fails the whole call if one metric is deleted (404) or lacks the granularity (400),
+        so on those errors the metrics are split in half and each half is fetched, leaving out
+        only the metrics that fail on their own.
+        """
+        operations = "(metric " + " ".join(f"({metric_id} {aggregation})" for metric_id, aggregation in metric_aggregations) + ")"
+        try:
+            args = {'operations':operations, 'granularity':granularity, 'start':start, 'stop':stop}
+            not_none_args = {k:v for k,v in args.items() if v is not None}
+            self.__LOGGER.debug(f"Getting measures for {len(metric_aggregations)} metrics: [{not_none_args}]")
+            measures = self.client.aggregates.fetch(**not_none_args)['measures']
+            return measures
+        except Exception as e:
+            if len(metric_aggregations) > 1 and getattr(e, 'code', None) in GnocchiComponent.SPLITTABLE_ERROR_CODES:
+                self.__LOGGER.warning(f"Measures call for {len(metric_aggregations)} metrics failed : {type(e).__name__} - {e} - splitting the call")
+                metric_aggregations = list(metric_aggregations)
+                middle = len(metric_aggregations) // 2
+                measures = self.get_metrics_measures(metric_aggregations[:middle], granularity=granularity, start=start, stop=stop)
+                for metric_id, aggregations in self.get_metrics_measures(metric_aggregations[middle:], granularity=granularity, start=start, stop=stop).items():
+                    measures.setdefault(metric_id, {}).update(aggregations)
+                return measures
+            self.__LOGGER.error(f"FAILED - attempt : [{not_none_args}]")
+            self.__LOGGER.error(f"An unexpected error occured during the above metric call : {type(e).__name__} - {e}")
+            self.__LOGGER.warning(f"Returning empty dict due to [{type(e).__name__}]")
+            return {}
+
     def get_metric_measure(self, metric, granularity=None, aggregation=None, refresh=True, start=None, stop=None, limit=None):
         try:
             args = {'metric':metric, 'granularity':granularity, 'aggregation':aggregation, 'refresh':refresh, 'start':start, 'stop':stop, 'limit':limit}
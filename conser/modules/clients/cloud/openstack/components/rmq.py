@@ -31,13 +31,33 @@
 from conser.utils.service_logger import create_logger
 import conser.exceptions as EXCP
 from conser.factory.abs_classes.components import Component
+from conser.utils.coalescer import EventCoalescer
 import conser.utils.common as UTILS
 
 # Py Packages
 import pika
 import json
+import time
 
 class RMQComponent(Component):
+    ############
+    # DEFAULTS #
+    ############
+    # 'blocking' - BlockingConnection, 'async' - SelectConnection with automatic reconnect
+    CONSUMER_MODES = ['blocking', 'async']
+    # Max unacked messages delivered to the consumer at once
+    DEFAULT_PREFETCH = 50
+    DEFAULT_HEARTBEAT = 60
+    # Seconds before reconnecting - doubled after each failed attempt up to the max
+    RECONNECT_DELAY = 1
+    MAX_RECONNECT_DELAY = 60
+    # Events for the same stack/project are coalesced into one resync request, released once
+    # no event has arrived for the window or the max latency has passed - a window of 0 disables it
+    DEFAULT_DEBOUNCE_WINDOW = 2
+    DEFAULT_DEBOUNCE_MAX_LATENCY = 10
+    # Seconds between checks for coalesced groups ready to release
+    DEBOUNCE_TICK = 0.5
+
     def __init__(self, queue_config, log_file, log_level):
         self._LOG_FILE = log_file
         self._LOG_LEVEL = log_level
@@ -48,9 +68,45 @@ class RMQComponent(Component):
             'orchestration.stack'
         ]
         self.queue = 'notifications.info'
-        self.client = self.get_connection_obj(queue_config)
+        self.consumer_mode = queue_config.get('rmq_consumer', 'blocking')
+        if self.consumer_mode not in RMQComponent.CONSUMER_MODES:
+            raise EXCP.InvalidArguments(f"rmq_consumer:{self.consumer_mode}")
+        self.prefetch = int(queue_config.get('rmq_prefetch', RMQComponent.DEFAULT_PREFETCH))
+        self.heartbeat = int(queue_config.get('rmq_heartbeat', RMQComponent.DEFAULT_HEARTBEAT))
+        debounce_window = float(queue_config.get('rmq_debounce_window', RMQComponent.DEFAULT_DEBOUNCE_WINDOW))
+        self.coalescer = None
+        if debounce_window > 0:
+            self.coalescer = EventCoalescer(
+                debounce_window,
+                queue_config.get('rmq_debounce_max_latency', RMQComponent.DEFAULT_DEBOUNCE_MAX_LATENCY),
+                self._LOG_FILE,
+                self._LOG_LEVEL
+            )
+        # Async consumer state
+        self._connection = None
+        self._channel = None
+        self._consuming = False
+        self._stopping = False
+        if self.consumer_mode == 'blocking':
+            self.client = self.get_connection_obj(queue_config)
+        else:
+            #-- The async consumer connects (and reconnects) in start_listening
+            self._parameters = self._get_connection_parameters(queue_config)
+            self.client = None
 
     def get_connection_obj(self, config_dict):
+        # Get channel
+        connection = pika.BlockingConnection(self._get_connection_parameters(config_dict))
+        channel = connection.channel()
+        channel.basic_qos(prefetch_count=self.prefetch)
+        channel.basic_consume(
+            queue=self.queue,
+            on_message_callback=self.filter_rmq_message,
+            auto_ack=False
+        )
+        return channel
+
+    def _get_connection_parameters(self, config_dict):
         # Get creds
         mq_username = config_dict['rmq_username']
         mq_password = config_dict['rmq_password']
@@ -59,26 +115,55 @@ class RMQComponent(Component):
         mq_address = config_dict['rmq_address']
         mq_port = config_dict['rmq_port']
         mq_path = config_dict['rmq_path']
-        parameters = pika.ConnectionParameters(mq_address, mq_port, mq_path, creds)
-        # Get channel
-        connection = pika.BlockingConnection(parameters)
-        channel = connection.channel()
-        channel.basic_consume(
-            queue=self.queue,
-            on_message_callback=self.filter_rmq_message,
-            auto_ack=True
+        return pika.ConnectionParameters(
+            host=mq_address,
+            port=mq_port,
+            virtual_host=mq_path,
+            credentials=creds,
+            heartbeat=self.heartbeat
         )
-        return channel
 
     def start_listening(self):
+        if self.consumer_mode == 'async':
+            self._start_async_consumer()
+            return
         self.__LOGGER.info(f"Starting Rabbit MQ Channel Consumer")
+        self._schedule_debounce_tick()
         self.client.start_consuming()
         self.__LOGGER.info(f"Stopped Rabbit MQ Channel Consumer\n")
 
     def filter_rmq_message(self, ch, method, properties, body):
+        # Messages are only acked once any resync they trigger is durably queued,
+        # so a message being handled when the process dies is redelivered
+        try:
+            resync = self._handle_message(body)
+            if resync and self.coalescer:
+                #-- Acked once its group is released
+                target, group = resync
+                self.coalescer.add(group, target, method.delivery_tag)
+                #-- Unacked messages count towards the prefetch, release early rather than stall
+                if self.coalescer.pending_tokens() >= self.prefetch:
+                    self._release_resync_groups(ch, force=True)
+                return
+            if resync:
+                target, group = resync
+                self.__LOGGER.debug(f"Requesting resync for {target[0]} {target[1]}")
+                UTILS.request_resync(*target)
+        except Exception as e:
+            #-- Retry once, after that the periodic full sync picks up the change
+            requeue = not method.redelivered
+            self.__LOGGER.error(f"Failed to handle message - {type(e).__name__} - {e} - {'Requeueing' if requeue else 'Dropping'}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=requeue)
+            return
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    def _handle_message(self, body):
+        """
+        Return the (resync target, coalescing group) for the message, or None if it doesn't need a resync.
+        """
         message = None
-        response = json.loads(body)
         try:
+            response = json.loads(body)
             message = json.loads(response['oslo.message'])
         except KeyError as e:
             self.__LOGGER.debug(f"Message did not contain 'oslo.message' key - Ignoring")
@@ -87,22 +172,176 @@ class RMQComponent(Component):
             self.__LOGGER.error(f"Failed to load message - {type(e).__name__} - {e} - Skipping")
             return
         self.__LOGGER.debug(f"MQ message caught - Checking if supported - '{message['event_type']}'")
-        self.__LOGGER.debug(f"Creating RESYNC HOLD file")
-        UTILS.check_resync_hold()
         for evnt_t in self.event_types:
             if message['event_type'].startswith(evnt_t):
-                self.__LOGGER.debug(f"Creating RESYNC FLAG file")
-                UTILS.create_resync_flag()
-                self.__LOGGER.debug(f"Deleting RESYNC HOLD file")
-                UTILS.delete_resync_hold()
-                return
-        self.__LOGGER.debug(f"Deleting RESYNC HOLD file")
-        UTILS.delete_resync_hold()
+                instance_id = self._get_instance_id(message)
+                if instance_id:
+                    self.__LOGGER.debug(f"Invalidating cached metrics info for instance {instance_id}")
+                    UTILS.invalidate_metrics_cache(instance_id)
+                target = self._get_resync_target(message)
+                return target, self._get_resync_group(message, target)
         self.__LOGGER.debug(f"Message event type '{message['event_type']}' not found in supported event types - Ignoring")
 
+    def _release_resync_groups(self, channel, force=False):
+        # Queue one resync request per released group, then ack every message in it
+        due = self.coalescer.pop_due(force=force)
+        if not due:
+            return
+        failed = False
+        try:
+            for group, targets, delivery_tags in due:
+                self.__LOGGER.debug(f"Requesting resync for {group} - {len(targets)} targets from {len(delivery_tags)} events")
+                for target_type, target_id in targets:
+                    UTILS.queue_resync_target(target_type, target_id)
+            UTILS.notify_resync()
+        except Exception as e:
+            self.__LOGGER.error(f"Failed to request resync - {type(e).__name__} - {e} - Requeueing messages")
+            failed = True
+        for group, targets, delivery_tags in due:
+            for delivery_tag in delivery_tags:
+                if failed:
+                    channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+                else:
+                    channel.basic_ack(delivery_tag=delivery_tag)
+        self.__LOGGER.info(f"Resync coalescing - {self.coalescer.stats()}")
+
+    def _schedule_debounce_tick(self):
+        if not self.coalescer:
+            return
+        if self.consumer_mode == 'async':
+            self._connection.ioloop.call_later(RMQComponent.DEBOUNCE_TICK, self._debounce_tick)
+        else:
+            self.client.connection.call_later(RMQComponent.DEBOUNCE_TICK, self._debounce_tick)
+
+    def _debounce_tick(self):
+        channel = self._channel if self.consumer_mode == 'async' else self.client
+        #-- Channel closed - a new tick is scheduled when consuming restarts
+        if channel is None:
+            return
+        self._release_resync_groups(channel)
+        self._schedule_debounce_tick()
+
+    ##################
+    # ASYNC CONSUMER #
+    ##################
+    def _start_async_consumer(self):
+        self.__LOGGER.info(f"Starting Rabbit MQ Async Consumer")
+        self._stopping = False
+        delay = RMQComponent.RECONNECT_DELAY
+        while not self._stopping:
+            self._consuming = False
+            self._connection = pika.SelectConnection(
+                parameters=self._parameters,
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_open_error,
+                on_close_callback=self._on_connection_closed
+            )
+            #-- Runs until the connection is closed
+            self._connection.ioloop.start()
+            if self._stopping:
+                break
+            #-- Only back off while the broker can't be consumed from
+            if self._consuming:
+                delay = RMQComponent.RECONNECT_DELAY
+            self.__LOGGER.warning(f"Rabbit MQ connection lost - reconnecting in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, RMQComponent.MAX_RECONNECT_DELAY)
+        self._connection = None
+        self.__LOGGER.info(f"Stopped Rabbit MQ Async Consumer\n")
+
+    def _on_connection_open(self, connection):
+        self.__LOGGER.debug(f"Rabbit MQ connection open - opening channel")
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_open_error(self, connection, error):
+        self.__LOGGER.error(f"Failed to open Rabbit MQ connection - {type(error).__name__} - {error}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        self.__LOGGER.debug(f"Rabbit MQ connection closed - {reason}")
+        self._channel = None
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.basic_qos(prefetch_count=self.prefetch, callback=self._on_qos_ok)
+
+    def _on_channel_closed(self, channel, reason):
+        self.__LOGGER.warning(f"Rabbit MQ channel closed - {reason}")
+        self._channel = None
+        #-- Unacked messages are redelivered by the broker, their delivery tags are no longer valid
+        if self.coalescer:
+            self.coalescer.clear()
+        if not (self._connection.is_closing or self._connection.is_closed):
+            self._connection.close()
+
+    def _on_qos_ok(self, frame):
+        self._channel.basic_consume(
+            queue=self.queue,
+            on_message_callback=self.filter_rmq_message,
+            auto_ack=False
+        )
+        self._consuming = True
+        self.__LOGGER.info(f"Consuming from '{self.queue}' with prefetch {self.prefetch}")
+        self._schedule_debounce_tick()
+
+    def _stop_async_consumer(self):
+        self._stopping = True
+        connection = self._connection
+        if connection is None or connection.is_closing or connection.is_closed:
+            return
+        #-- Safe to call from outside the ioloop thread
+        connection.ioloop.add_callback_threadsafe(connection.close)
+
+    def _get_instance_id(self, message):
+        if not message['event_type'].startswith('compute.instance'):
+            return None
+        payload = message.get('payload', {})
+        if 'instance_id' in payload:
+            return payload['instance_id']
+        # Versioned notifications
+        return payload.get('nova_object.data', {}).get('uuid')
+
+    def _get_resync_target(self, message):
+        """
+        Return the (target_type, target_id) that a targeted resync needs to look at for the message.
+        Deletes, and messages without a usable ID, need a full resync.
+        """
+        if '.delete.' in message['event_type']:
+            return ('full', None)
+        payload = message.get('payload', {})
+        if message['event_type'].startswith('compute.instance'):
+            instance_id = self._get_instance_id(message)
+            if instance_id:
+                return ('server', instance_id)
+            project_id = payload.get('tenant_id') or payload.get('nova_object.data', {}).get('tenant_id')
+        else:
+            # Heat payloads carry the stack ARN - 'arn:openstack:heat::<project>:stacks/<name>/<id>'
+            stack_id = payload.get('stack_id') or payload.get('stack_identity', '').rsplit('/', 1)[-1]
+            if stack_id:
+                return ('stack', stack_id)
+            project_id = payload.get('tenant_id')
+        if project_id:
+            return ('project', project_id)
+        return ('full', None)
+
+    def _get_resync_group(self, message, target):
+        # Servers are grouped by project, as a stack launch creates many servers in one project at once
+        target_type, target_id = target
+        if target_type != 'server':
+            return target
+        payload = message.get('payload', {})
+        project_id = payload.get('tenant_id') or payload.get('nova_object.data', {}).get('tenant_id')
+        if project_id:
+            return ('project', project_id)
+        return target
 
     def disconnect(self):
         self.__LOGGER.info(f"Disconnecting Rabbit MQ services")
+        if self.consumer_mode == 'async':
+            self._stop_async_consumer()
+            return
         try:
             self.client.stop_consuming()
         except Exception as e:
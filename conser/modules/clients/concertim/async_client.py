@@ -0,0 +1,122 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Local Imports
+from conser.utils.service_logger import create_logger
+
+# Py Packages
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+class AsyncConcertimClient(object):
+    """
+    Coroutine version of a ConcertimClient, for handlers that make many independent
+    Concertim calls per cycle.
+
+    Every ConcertimClient API method is available as a coroutine with the same
+    arguments. Calls are made by the wrapped ConcertimClient (same ENDPOINTS
+    templating, pooled session and 422/401 handling) on a thread pool of
+    max_concurrency threads, so they run concurrently without blocking the event loop.
+
+    Example:
+        async_client = AsyncConcertimClient(concertim_client, log_file, log_level)
+        results = asyncio.run(async_client.gather_with_semaphore(
+            [async_client.update_rack(ID, variables) for ID, variables in rack_updates]
+        ))
+    """
+    ############
+    # DEFAULTS #
+    ############
+    ASYNC_METHODS = [
+        'create_compute_device', 'create_network_device', 'create_volume_device', 'create_rack', 'create_template',
+        'delete_device', 'delete_rack', 'delete_template',
+        'list_devices', 'list_racks', 'list_templates', 'list_users', 'list_teams',
+        'show_device', 'show_rack', 'move_device',
+        'update_user', 'update_team', 'update_compute_device', 'update_network_device', 'update_volume_device',
+        'update_rack', 'update_template',
+        'send_metric'
+    ]
+
+    ########
+    # INIT #
+    ########
+    def __init__(self, concertim_client, log_file, log_level, max_concurrency=None):
+        self._LOG_LEVEL = log_level
+        self._LOG_FILE = log_file
+        self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
+        self.client = concertim_client
+        self.max_concurrency = max_concurrency if max_concurrency else concertim_client.metrics_workers
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+    ###########################################
+    # ASYNC CONCERTIM CLIENT OBJECT FUNCTIONS #
+    ###########################################
+    async def gather_with_semaphore(self, coros, limit=None, return_exceptions=True):
+        """
+        Await all the given coroutines with at most 'limit' (default max_concurrency)
+        running at once. Results are returned in the same order as coros - with
+        exceptions returned in place of results if return_exceptions is True.
+        """
+        semaphore = asyncio.Semaphore(limit if limit else self.max_concurrency)
+
+        async def limited(coro):
+            async with semaphore:
+                return await coro
+
+        return await asyncio.gather(*[limited(coro) for coro in coros], return_exceptions=return_exceptions)
+
+    def disconnect(self):
+        """
+        Shut down the thread pool. The wrapped ConcertimClient is left connected,
+        as it is owned by the handler.
+        """
+        self.__LOGGER.info("Disconnecting Async Concertim Client")
+        self._executor.shutdown(wait=True)
+        self.client = None
+
+    ##################################
+    # ASYNC CONCERTIM CLIENT HELPERS #
+    ##################################
+    async def _run(self, method_name, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(getattr(self.client, method_name), *args, **kwargs)
+        )
+
+def _async_method(method_name):
+    async def method(self, *args, **kwargs):
+        return await self._run(method_name, *args, **kwargs)
+    method.__name__ = method_name
+    method.__doc__ = f"Coroutine version of ConcertimClient.{method_name}"
+    return method
+
+for _method_name in AsyncConcertimClient.ASYNC_METHODS:
+    setattr(AsyncConcertimClient, _method_name, _async_method(_method_name))
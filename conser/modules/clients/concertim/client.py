@@ -33,12 +33,18 @@ import conser.exceptions as EXCP
 from conser.factory.abs_classes.clients import Client
 # endpoints file containing info on all concertim endpoints
 from conser.modules.clients.concertim.utils.endpoints import ENDPOINTS
+# request body templates from ENDPOINTS, compiled at import
+from conser.modules.clients.concertim.utils.templates import COMPILED_TEMPLATES, build_data
+# auth token shared between clients in the process
+from conser.modules.clients.concertim.utils.token import get_shared_token
 
 # Py Packages
 import sys
 import json
+from concurrent.futures import ThreadPoolExecutor
 # Disable insecure warnings  
 import requests
+from urllib3.util.retry import Retry
 requests.packages.urllib3.disable_warnings() 
 
 class ConcertimClient(Client):
@@ -46,6 +52,12 @@ class ConcertimClient(Client):
     # DEFAULTS #
     ############
     DEFAULT_RACK_HEIGHT=42
+    # Max number of metrics sent to concertim at the same time by send_metrics
+    DEFAULT_METRICS_WORKERS=8
+    # Connection pool defaults - retries are only made for failed connections
+    DEFAULT_POOL_SIZE=10
+    DEFAULT_CONNECTION_RETRIES=3
+    DEFAULT_RETRY_BACKOFF=0.5
 
     ########
     # INIT #
@@ -56,9 +68,11 @@ class ConcertimClient(Client):
         self.__LOGGER = create_logger(__name__, self._LOG_FILE, log_level)
         self.__LOGGER.info("CREATING CONCERTIM CLIENT")
         self._URL = self._CONFIG['concertim_url']
-        self.__retry_count = 0
-        self.__AUTH_TOKEN = self.get_connection_obj()
         self.rack_height = ConcertimClient.DEFAULT_RACK_HEIGHT if 'default_rack_height' not in self._CONFIG else self._CONFIG['default_rack_height']
+        self.metrics_workers = ConcertimClient.DEFAULT_METRICS_WORKERS if 'metrics_workers' not in self._CONFIG else max(1, int(self._CONFIG['metrics_workers']))
+        self._session = self.__create_session()
+        self.__TOKEN = get_shared_token(self._URL, self._CONFIG['concertim_username'])
+        self.__TOKEN.get(self.get_connection_obj)
 
     #####################################
     # CONCERTIM CLIENT OBJECT FUNCTIONS #
@@ -174,6 +188,27 @@ class ConcertimClient(Client):
             self.__LOGGER.error(f"FAILED - Could not send metric for {variables_dict['name']} - {type(e).__name__} - {e} - {sys.exc_info()[2].tb_frame.f_code.co_filename} - {sys.exc_info()[2].tb_lineno}")
             raise e
 
+    def send_metrics(self, metrics_list):
+        """
+        Send many metrics to concertim concurrently (up to self.metrics_workers at a time).
+        ACCEPTS:
+            metrics_list - list of (ID, variables_dict) tuples, as for send_metric
+
+        Returns a list with the exception raised for each metric (None if it was sent),
+        in the same order as metrics_list.
+        """
+        if not metrics_list:
+            return []
+        def send(metric):
+            try:
+                self.send_metric(metric[0], metric[1])
+                return None
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=min(self.metrics_workers, len(metrics_list))) as executor:
+            return list(executor.map(send, metrics_list))
+
     ####################################
     # CLIENT OBJECT REQUIRED FUNCTIONS #
     ####################################
@@ -187,15 +222,18 @@ class ConcertimClient(Client):
 
     def disconnect(self):
         self.__LOGGER.info("Disconnecting Concertim Client")
-        self.__AUTH_TOKEN = None
+        self.__TOKEN = None
         self._URL = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
     ############################
     # CONCERTIM CLIENT HELPERS #
     ############################
 
     # Generic method for handling Concertim API calls.
-    def _api_call(self, method, endpoint_name, variables_dict={}, endpoint_var=''):
+    def _api_call(self, method, endpoint_name, variables_dict={}, endpoint_var='', is_retry=False):
         """
         Generic method for handling Concertim API calls.
         ACCEPTS:
@@ -204,13 +242,14 @@ class ConcertimClient(Client):
                             (CREATE_DEVICE, DELETE_DEVICE, UPDATE_DEVICE, etc)
             *variables_dict - the dictionary containing all needed variables to make the API call
             *endpoint_var - this is the ID or NAME of a device/template/rack that needs to be filled in the URL string
+            *is_retry - set when the call is being retried after re-authenticating
         
         Will return the JSON response, or raise an exception based on the status code
         NOTE: if sending LOGIN_AUTH for the endpoint, it will not add the Authorization to the header
               and will return the auth token instead of the response.json()
         """
         endpoint = ENDPOINTS[method.upper()]['endpoints'][endpoint_name]
-        headers = ENDPOINTS[method.upper()]['headers']
+        headers = dict(ENDPOINTS[method.upper()]['headers'])
         # Handle endpoint formatting
         if endpoint_var:
             url = self._URL + endpoint['endpoint'].format(endpoint_var)
@@ -218,11 +257,14 @@ class ConcertimClient(Client):
             url = self._URL + endpoint['endpoint']
 
         # Handle if it is LOGIN_AUTH
-        if endpoint_name != 'LOGIN_AUTH' and self.__AUTH_TOKEN is not None:
-            headers["Authorization"] = self.__AUTH_TOKEN
-        elif endpoint_name == 'LOGIN_AUTH':
+        auth_token = None
+        if endpoint_name == 'LOGIN_AUTH':
             self.__LOGGER.debug("Getting Concertim Auth Token")
-        elif self.__AUTH_TOKEN is None:
+        elif self.__TOKEN is not None:
+            #-- Refreshed here if the token is missing or about to expire
+            auth_token = self.__TOKEN.get(self.get_connection_obj)
+            headers["Authorization"] = auth_token
+        else:
             e = EXCP.MissingRequiredArgs("No Authentication Token provided")
             self.__LOGGER.error(f"{type(e).__name__} - {e}")
             raise e
@@ -230,7 +272,7 @@ class ConcertimClient(Client):
         # Handle if there is a 'data' dump needed
         if variables_dict:
             self.__check_required_vars(variables_dict, endpoint)
-            data_dict = self.__get_data(variables_dict, endpoint['data'], endpoint_name)
+            data_dict = self.__get_data(variables_dict, endpoint_name)
             data = json.dumps(data_dict)
             self.__LOGGER.debug(f"Data to send: {data}")
             # Don't log user/pass in plain text
@@ -239,17 +281,16 @@ class ConcertimClient(Client):
             else:
                 self.__LOGGER.debug(f"API CALL ({method}) - {url} : data [{data}]")
 
-            response = getattr(requests, method.lower())(url, headers=headers, data=data, verify=False)
+            response = getattr(self._session, method.lower())(url, headers=headers, data=data, verify=False)
         else:
             self.__LOGGER.debug(f"API CALL ({method}) - {url}")
-            response = getattr(requests, method.lower())(url, headers=headers, verify=False)
+            response = getattr(self._session, method.lower())(url, headers=headers, verify=False)
 
         # Handle response status codes
         if response.status_code in [200, 201]:
             # Send the token if it is the login endpoint, else return the response.json
             if endpoint_name == 'LOGIN_AUTH':
                 return response.headers.get("Authorization")
-            self.__retry_count = 0
             return response.json()
         elif response.status_code == 422:
             ''' 
@@ -271,46 +312,43 @@ class ConcertimClient(Client):
         #    self.__LOGGER.warning(f"{type(e).__name__} - {e}")
         #    raise e
         elif response.status_code in [401,403,405,407,408]:
-            if self.__retry_count == 0:
+            if not is_retry and endpoint_name != 'LOGIN_AUTH':
                 self.__LOGGER.warning(f"API call failed due to one of the following codes '[401,403,405,407,408]' - retrying once")
-                self.__retry(method, endpoint_name, variables_dict=variables_dict, endpoint_var=endpoint_var)
+                return self.__retry(auth_token, method, endpoint_name, variables_dict=variables_dict, endpoint_var=endpoint_var)
             else:
                 self.__LOGGER.error('Unhandled REST request error.')
-                self.__retry_count = 0
                 response.raise_for_status()
         else:
             self.__LOGGER.error('Unhandled REST request error.')
             response.raise_for_status()
 
-    # Return the given data template from ENDPOINTS with all var filled in from variables_dict
-    # Uses recursion to traverse through the dict
-    # If the endpoint name is an UPDATE_* call, remove empty key,val pairs before returning
-    def __get_data(self, variables_dict, data_template, endpoint_name):
+    # Create the keep-alive session used for all API calls
+    # Failed connections are retried with backoff, requests that reached concertim are not
+    def __create_session(self):
+        pool_size = max(int(self._CONFIG.get('connection_pool_size', ConcertimClient.DEFAULT_POOL_SIZE)), self.metrics_workers)
+        retries = Retry(
+            total=int(self._CONFIG.get('connection_retries', ConcertimClient.DEFAULT_CONNECTION_RETRIES)),
+            connect=int(self._CONFIG.get('connection_retries', ConcertimClient.DEFAULT_CONNECTION_RETRIES)),
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=float(self._CONFIG.get('connection_backoff', ConcertimClient.DEFAULT_RETRY_BACKOFF))
+        )
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        self.__LOGGER.debug(f"Created Concertim session - pool size {pool_size}")
+        return session
+
+    # Return the data template from ENDPOINTS for the endpoint with all vars filled in from variables_dict
+    # Uses the template compiled at import (see utils/templates.py)
+    # If the endpoint name is an UPDATE_* call, keys with no matching var are left out
+    def __get_data(self, variables_dict, endpoint_name):
         try:
-            data_dict = {}
-            casting = {'value': float, 'ttl': int}
-            for key, value in data_template.items():
-                if isinstance(value, dict):
-                    data_dict[key] = self.__get_data(variables_dict, value, endpoint_name)
-                    if key == 'metadata' and not data_dict['metadata']:
-                        del data_dict['metadata']
-                else:
-                    if key in casting:
-                        data_dict[key] = casting[key](value.format(**variables_dict))
-                    elif value.replace('{','').replace('}','') not in variables_dict and endpoint_name in [
-                        'UPDATE_COMPUTE_DEVICE',
-                        'UPDATE_NETWORK_DEVICE',
-                        'UPDATE_VOLUME_DEVICE',
-                        'UPDATE_RACK',
-                        'UPDATE_TEMPLATE',
-                        'UPDATE_USER'
-                    ]:
-                        continue
-                    else:
-                        data_dict[key] = value.format(**variables_dict)
-            return data_dict
+            return build_data(COMPILED_TEMPLATES[endpoint_name], variables_dict)
         except Exception as e:
-            self.__LOGGER.error(f"Failed to fill data template from ENDPOINTS {endpoint_name} - template:{data_template} - variables:{variables_dict}")
+            self.__LOGGER.error(f"Failed to fill data template from ENDPOINTS {endpoint_name} - variables:{variables_dict}")
             self.__LOGGER.error(f"{type(e).__name__} - {e} - {sys.exc_info()[2].tb_frame.f_code.co_filename} - {sys.exc_info()[2].tb_lineno}")
             raise e
     # Return Ture if all necessary vars are present, otherwise raise an err
@@ -322,9 +360,8 @@ class ConcertimClient(Client):
             raise e
         return True
 
-    def __retry(self, *args, **kwargs):
+    def __retry(self, failed_token, *args, **kwargs):
         self.__LOGGER.debug(f"Retrying API call after re-authenticating")
-        self.__retry_count += 1
-        self.__AUTH_TOKEN = self.get_connection_obj()
-        self.__LOGGER.debug(f"Retry count : {self.__retry_count}")
-        self._api_call(*args, **kwargs)
+        #-- Only log in again if no other call has already replaced the failed token
+        self.__TOKEN.refresh(self.get_connection_obj, stale_value=failed_token)
+        return self._api_call(*args, is_retry=True, **kwargs)
@@ -29,12 +29,22 @@
 
 import conser.exceptions as EXCP
 class ConcertimView(object):
+    # Position of each ID origin in an object's ID tuple
+    ID_ORIGINS = {
+        'concertim': 0,
+        'cloud': 1,
+        'billing': 2
+    }
+    INDEXED_DICTS = ['racks', 'devices', 'users', 'templates', 'teams']
+
     def __init__(self):
         self.racks = {}
         self.devices = {}
         self.users = {}
         self.templates = {}
         self.teams = {}
+        self._indices = {}
+        self.rebuild_search_indices()
 
     def __repr__(self):
         return f"<ConcertimView: \
@@ -44,35 +54,45 @@ class ConcertimView(object):
                     teams:{repr(self.teams)}, \
                     templates:{repr(self.templates)}}}>"
 
+    def __getstate__(self):
+        # The search indices are derived data - don't pickle them
+        state = self.__dict__.copy()
+        state.pop('_indices', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.rebuild_search_indices()
+
     def add_device(self, device):
-        self.devices[device.id] = device
+        self._add_to_dict('devices', device)
 
     def remove_device(self, device):
-        del self.devices[device.id]
+        self._remove_from_dict('devices', device)
 
     def add_rack(self, rack):
-        self.racks[rack.id] = rack
+        self._add_to_dict('racks', rack)
 
     def remove_rack(self, rack):
-        del self.racks[rack.id]
+        self._remove_from_dict('racks', rack)
 
     def add_user(self, user):
-        self.users[user.id] = user
+        self._add_to_dict('users', user)
 
     def remove_user(self, user):
-        del self.users[user.id]
+        self._remove_from_dict('users', user)
 
     def add_team(self, team):
-        self.teams[team.id] = team
+        self._add_to_dict('teams', team)
 
     def remove_team(self, team):
-        del self.teams[team.id]
+        self._remove_from_dict('teams', team)
 
     def add_template(self, template):
-        self.templates[template.id] = template
+        self._add_to_dict('templates', template)
 
     def remove_template(self, template):
-        del self.templates[template.id]
+        self._remove_from_dict('templates', template)
 
     def is_empty(self):
         if self.users or self.templates or self.racks or self.devices:
@@ -90,35 +110,33 @@ class ConcertimView(object):
             id_value: the known ID field to search for
             id_origin: what the known ID is from, valid fields are [concertim, cloud, billing]
         """
-        dict_to_search = None
+        dict_name = None
         index_to_search = None
         return_item = None
 
         if object_type == 'racks' or object_type == 'rack':
-            dict_to_search = self.racks
+            dict_name = 'racks'
         elif object_type == 'devices' or object_type == 'device':
-            dict_to_search = self.devices
+            dict_name = 'devices'
         elif object_type == 'users' or object_type == 'user':
-            dict_to_search = self.users
+            dict_name = 'users'
         elif object_type == 'templates' or object_type == 'template':
-            dict_to_search = self.templates
+            dict_name = 'templates'
         elif object_type == 'teams' or object_type == 'team':
-            dict_to_search = self.teams
+            dict_name = 'teams'
         else:
             raise EXCP.InvalidSearchAttempt(object_type)
 
-        if id_origin == 'concertim':
-            index_to_search = 0
-        elif id_origin == 'cloud':
-            index_to_search = 1
-        elif id_origin == 'billing':
+        if id_origin == 'billing':
             if object_type not in ['rack', 'racks', 'user', 'users', 'team', 'teams']:
                 raise EXCP.InvalidSearchAttempt(f"{object_type}.{id_origin}")
-            index_to_search = 2
-        else:
+        elif id_origin not in ConcertimView.ID_ORIGINS:
             raise EXCP.InvalidSearchAttempt(id_origin)
+        index_to_search = ConcertimView.ID_ORIGINS[id_origin]
 
-        matches = [v for k,v in dict_to_search.items() if k[index_to_search] == id_value]
+        dict_to_search = getattr(self, dict_name)
+        matching_keys = self._indices[dict_name].get(index_to_search, {}).get(id_value, {})
+        matches = [dict_to_search[k] for k in matching_keys]
         if len(matches) == 1:
             return_item = matches[0]
         elif len(matches) > 1:
@@ -148,36 +166,47 @@ class ConcertimView(object):
         dicts_to_merge = ['templates', 'devices', 'racks', 'users', 'teams']
         for dict_name in dicts_to_merge:
             setattr(self, dict_name, getattr(other_view, dict_name))
+        self.rebuild_search_indices()
 
     def delete_stale_items(self):
         """
         Function that loops over the current dicts and deletes any keys that have a more recent, matching key
         (if key is (1,None,None) and there exists (1,2,3) then delete the key)
+
+        A partial key is matched on its first known ID only, so each complete key's IDs are
+        put in a per-position set and every partial key is checked with a single lookup.
         """
         dicts_to_merge = ['templates', 'devices', 'racks', 'users']
         # Loop over all dicts
         for dict_name in dicts_to_merge:
-            # Get all partially filled keys and all completed keys
-            partials = [k for k in getattr(self, dict_name) if not all(k)]
-            completes = [k for k in getattr(self, dict_name) if all(k)]
-            # Loop over the list of completed keys and partial keys - check if there are any matching keys
-            # If a partial matching key exists, delete it from the dict
+            obj_dict = getattr(self, dict_name)
+            # Map each ID tuple position to the IDs that completed keys hold at that position
+            complete_ids_by_position = {}
+            partials = []
+            for id_tup in obj_dict:
+                if all(id_tup):
+                    for position, id_value in enumerate(id_tup):
+                        complete_ids_by_position.setdefault(position, set()).add(id_value)
+                else:
+                    partials.append(id_tup)
+            # Find every partial key whose first known ID also appears in a completed key
+            stale_keys = []
             for partial_id_tup in partials:
-                for complete_id_tup in completes:
-                    if self._check_partial_match(partial_id_tup, complete_id_tup):
-                        del getattr(self, dict_name)[partial_id_tup]
-
-    def _check_partial_match(self, partial_tup, complete_tup):
-        matching = False
-        for i in range(len(partial_tup)):
-            if not partial_tup[i]:
-                continue
-            elif partial_tup[i] != complete_tup[i]:
-                break
-            elif partial_tup[i] == complete_tup[i]:
-                matching = True
-                break
-        return matching
+                position = self._first_known_id_position(partial_id_tup)
+                if position is None:
+                    continue
+                if partial_id_tup[position] in complete_ids_by_position.get(position, ()):
+                    stale_keys.append(partial_id_tup)
+            # Delete after the scan so the dict is not changed while iterating it
+            for stale_id_tup in stale_keys:
+                del obj_dict[stale_id_tup]
+        self.rebuild_search_indices()
+
+    def _first_known_id_position(self, id_tup):
+        for position, id_value in enumerate(id_tup):
+            if id_value:
+                return position
+        return None
 
     def rebuild_indices(self):
         '''
@@ -197,3 +226,43 @@ class ConcertimView(object):
 
         new_devices = { d.id: d for d in self.devices.values() }
         self.devices = new_devices
+
+        self.rebuild_search_indices()
+
+    def rebuild_search_indices(self):
+        """
+        Recreate the per-origin search indices from the current dict keys.
+
+        Each indexed dict gets a map of ID tuple position -> ID value -> keys
+        with that value, so that search() does not have to scan the whole dict.
+        Keys are held in insertion-ordered dicts to keep the same match order as
+        iterating the object dict itself.
+        """
+        self._indices = {}
+        for dict_name in ConcertimView.INDEXED_DICTS:
+            self._indices[dict_name] = {}
+            for id_tup in getattr(self, dict_name):
+                self._index_key(dict_name, id_tup)
+
+    def _add_to_dict(self, dict_name, obj):
+        getattr(self, dict_name)[obj.id] = obj
+        self._index_key(dict_name, obj.id)
+
+    def _remove_from_dict(self, dict_name, obj):
+        del getattr(self, dict_name)[obj.id]
+        self._unindex_key(dict_name, obj.id)
+
+    def _index_key(self, dict_name, id_tup):
+        dict_index = self._indices[dict_name]
+        for position, id_value in enumerate(id_tup):
+            dict_index.setdefault(position, {}).setdefault(id_value, {})[id_tup] = None
+
+    def _unindex_key(self, dict_name, id_tup):
+        dict_index = self._indices[dict_name]
+        for position, id_value in enumerate(id_tup):
+            value_keys = dict_index.get(position, {}).get(id_value)
+            if value_keys is None:
+                continue
+            value_keys.pop(id_tup, None)
+            if not value_keys:
+                del dict_index[position][id_value]
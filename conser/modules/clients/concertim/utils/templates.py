@@ -0,0 +1,129 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Local Imports
+from conser.modules.clients.concertim.utils.endpoints import ENDPOINTS
+
+# Py Packages
+import re
+
+# COMPILED REQUEST BODY TEMPLATES
+# Each ENDPOINTS 'data' template is compiled once, at import, into a flat list of
+# build steps, so building a request body is a single loop over the steps.
+#
+#   (DICT, parent, key)                         - add a new nested dict
+#   (VALUE, parent, key, kind, arg, cast, omit) - add a leaf value
+#   (DROP_IF_EMPTY, parent, key, child)         - delete an empty nested dict (metadata)
+#
+# 'parent'/'child' are indexes into the list of dicts created so far (0 is the body).
+DICT = 0
+VALUE = 1
+DROP_IF_EMPTY = 2
+# Leaf kinds
+PLACEHOLDER = 0     # exactly '{name}'
+LITERAL = 1         # no placeholders
+FORMAT = 2          # anything else - uses str.format
+# Values for these keys are cast after being filled in
+CASTING = {'value': float, 'ttl': int}
+# For these endpoints, keys with no matching variable are left out of the body
+OMIT_IF_MISSING_ENDPOINTS = [
+    'UPDATE_COMPUTE_DEVICE',
+    'UPDATE_NETWORK_DEVICE',
+    'UPDATE_VOLUME_DEVICE',
+    'UPDATE_RACK',
+    'UPDATE_TEMPLATE',
+    'UPDATE_USER'
+]
+PLACEHOLDER_RE = re.compile(r'^\{(\w+)\}$')
+
+def compile_template(data_template, omit_if_missing=False):
+    """
+    Return the list of build steps for the given ENDPOINTS 'data' template.
+    """
+    steps = []
+    dict_count = [1]
+
+    def compile_dict(template, index):
+        for key, value in template.items():
+            if isinstance(value, dict):
+                child = dict_count[0]
+                dict_count[0] += 1
+                steps.append((DICT, index, key))
+                compile_dict(value, child)
+                if key == 'metadata':
+                    steps.append((DROP_IF_EMPTY, index, key, child))
+                continue
+            cast = CASTING.get(key)
+            # Missing variables are only left out for non-cast keys, matching the name
+            # (or literal value) with any braces removed
+            omit = value.replace('{','').replace('}','') if omit_if_missing and cast is None else None
+            placeholder = PLACEHOLDER_RE.match(value)
+            if placeholder:
+                steps.append((VALUE, index, key, PLACEHOLDER, placeholder.group(1), cast, omit))
+            elif '{' not in value and '}' not in value:
+                steps.append((VALUE, index, key, LITERAL, value, cast, omit))
+            else:
+                steps.append((VALUE, index, key, FORMAT, value, cast, omit))
+
+    compile_dict(data_template, 0)
+    return steps
+
+def build_data(steps, variables_dict):
+    """
+    Return the request body built from compiled template steps and the given variables.
+    Raises KeyError if a variable needed by the template is missing.
+    """
+    dicts = [{}]
+    for step in steps:
+        if step[0] == VALUE:
+            op, parent, key, kind, arg, cast, omit = step
+            if omit is not None and omit not in variables_dict:
+                continue
+            if kind == PLACEHOLDER:
+                value = format(variables_dict[arg], '')
+            elif kind == LITERAL:
+                value = arg
+            else:
+                value = arg.format(**variables_dict)
+            dicts[parent][key] = cast(value) if cast else value
+        elif step[0] == DICT:
+            child = {}
+            dicts[step[1]][step[2]] = child
+            dicts.append(child)
+        elif not dicts[step[3]]:
+            del dicts[step[1]][step[2]]
+    return dicts[0]
+
+# Compiled steps for every endpoint with a data template, by endpoint name
+COMPILED_TEMPLATES = {
+    endpoint_name: compile_template(endpoint['data'], endpoint_name in OMIT_IF_MISSING_ENDPOINTS)
+    for method in ENDPOINTS.values()
+    for endpoint_name, endpoint in method['endpoints'].items()
+    if 'data' in endpoint
+}
@@ -0,0 +1,108 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Py Packages
+import threading
+import time
+import jwt
+
+# Tokens shared by all ConcertimClients in the process, by (concertim_url, username)
+_SHARED_TOKENS = {}
+_SHARED_TOKENS_LOCK = threading.Lock()
+
+def get_shared_token(concertim_url, username):
+    """
+    Return the ConcertimToken shared by every client logging in to the
+    given Concertim as the given user.
+    """
+    with _SHARED_TOKENS_LOCK:
+        if (concertim_url, username) not in _SHARED_TOKENS:
+            _SHARED_TOKENS[(concertim_url, username)] = ConcertimToken()
+        return _SHARED_TOKENS[(concertim_url, username)]
+
+class ConcertimToken(object):
+    """
+    A Concertim auth token and its expiry (from the JWT 'exp' claim).
+
+    The token is refreshed by the first caller that finds it missing or within
+    REFRESH_MARGIN seconds of expiring, so calls are not sent with an expired token.
+    All access is under a lock so a token can be shared between threads and clients.
+    """
+    ############
+    # DEFAULTS #
+    ############
+    REFRESH_MARGIN = 60
+
+    ########
+    # INIT #
+    ########
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.value = None
+        self.expires_at = None
+
+    def get(self, login_func):
+        """
+        Return a valid token, logging in with login_func first if needed.
+        """
+        with self._lock:
+            if self.value is None or self._is_expiring():
+                self._set(login_func())
+            return self.value
+
+    def refresh(self, login_func, stale_value=None):
+        """
+        Log in again with login_func and return the new token - unless another
+        caller has already replaced stale_value, in which case that token is returned.
+        """
+        with self._lock:
+            if stale_value is None or self.value == stale_value:
+                self._set(login_func())
+            return self.value
+
+    def _is_expiring(self):
+        return self.expires_at is not None and time.time() >= self.expires_at - ConcertimToken.REFRESH_MARGIN
+
+    def _set(self, value):
+        self.value = value
+        self.expires_at = token_expiry(value)
+
+def token_expiry(token):
+    """
+    Return the 'exp' claim (epoch seconds) of a 'Bearer <jwt>' token, or None if it has none.
+    The signature is not verified - the expiry is only used to refresh in time.
+    """
+    if not token:
+        return None
+    try:
+        encoded = token.split(' ', 1)[1] if token.lower().startswith('bearer ') else token
+        exp = jwt.decode(encoded, options={"verify_signature": False}).get('exp')
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
@@ -58,11 +58,13 @@ class APIHandler(Handler):
     ########
     # INIT #
     ########
-    def __init__(self, clients_dict, log_file, log_level):
+    def __init__(self, clients_dict, log_file, log_level, cached_clients=()):
         self._LOG_LEVEL = log_level
         self._LOG_FILE = log_file
         self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
         self.clients = clients_dict
+        # Names of clients shared through the API client cache - not disconnected with the handler
+        self.cached_clients = set(cached_clients)
 
     #########################
     # API HANDLER FUNCTIONS #
@@ -594,6 +596,8 @@ class APIHandler(Handler):
         """
         self.__LOGGER.info("Disconnecting API Clients and Components")
         for name, client in self.clients.items():
+            if name in self.cached_clients:
+                continue
             client.disconnect()
         self.clients = None
 
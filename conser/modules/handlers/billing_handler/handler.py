@@ -32,9 +32,13 @@ from conser.utils.service_logger import create_logger
 from conser.factory.abs_classes.handlers import AbsBillingHandler
 import conser.exceptions as EXCP
 import conser.utils.common as UTILS
+from conser.utils.scheduler import IntervalScheduler
+from conser.modules.clients.concertim.async_client import AsyncConcertimClient
 
 # Py Packages
+import asyncio
 import math
+import json
 import time
 from datetime import datetime, timedelta
 
@@ -43,16 +47,35 @@ class BillingHandler(AbsBillingHandler):
     # DEFAULTS #
     ############
     BILLING_INTERVAL = 60
+    # Every FULL_FLUSH_CYCLES cycles all costs are sent, even if unchanged since they were last sent
+    FULL_FLUSH_CYCLES = 60
 
     ########
     # INIT #
     ########
-    def __init__(self, clients_dict, log_file, log_level):
+    def __init__(self, clients_dict, log_file, log_level, full_flush_cycles=None):
         self._LOG_LEVEL = log_level
         self._LOG_FILE = log_file
         self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
         self.clients = clients_dict
+        # Concertim cost pushes for each loop are sent concurrently through this
+        self.async_concertim = AsyncConcertimClient(self.clients['concertim'], self._LOG_FILE, self._LOG_LEVEL) if self.clients.get('concertim') else None
+        self.scheduler = IntervalScheduler(BillingHandler.BILLING_INTERVAL, self._LOG_FILE, self._LOG_LEVEL)
         self.view = None
+        # Generation of the view snapshot self.view was loaded from
+        self._view_generation = None
+        # Costs for every server/project from the cloud for the current cycle - None if it couldn't be fetched
+        self._cost_index = None
+        # Ledger of the last values sent - {ledger_key: {'value': , 'sent_at': }}
+        self.full_flush_cycles = BillingHandler.FULL_FLUSH_CYCLES if full_flush_cycles is None else int(full_flush_cycles)
+        self._cycle = 0
+        self._full_flush = False
+        self._ledger_seen = set()
+        try:
+            self.ledger = UTILS.load_billing_ledger()
+        except Exception as e:
+            self.__LOGGER.warning(f"Could not load billing ledger - sending all costs - {e}")
+            self.ledger = {}
 
     #############################
     # BILLING HANDLER FUNCTIONS #
@@ -69,15 +92,42 @@ class BillingHandler(AbsBillingHandler):
         start_date = datetime.today().date().replace(day=1)
         end_date = (start_date + timedelta(days=32)).replace(day=1)
 
+        #-- Only send changed values, unless this cycle is a full flush
+        #-- The first full flush is after full_flush_cycles cycles, so a restart does not resend
+        #-- everything the loaded ledger already holds
+        self._cycle += 1
+        self._full_flush = self.full_flush_cycles > 0 and self._cycle % self.full_flush_cycles == 0
+        self._ledger_seen = set()
+        if self._full_flush:
+            self.__LOGGER.debug("Full flush cycle - sending all costs")
+
+        #-- Fetch all costs at once, falling back to a query per object if that fails
+        try:
+            self._cost_index = self.clients['cloud'].get_all_costs(start=start_date, stop=end_date)
+        except Exception as e:
+            self.__LOGGER.warning(f"Could not fetch all costs in one query - fetching per object - {type(e).__name__} - {e}")
+            self._cost_index = None
+
         self.update_device_costs(start_date, end_date)
         self.update_rack_costs(start_date, end_date)
         self.update_team_costs_credits(start_date, end_date)
+
+        #-- Drop ledger entries for objects that are no longer billed
+        self.ledger = {key: entry for key, entry in self.ledger.items() if key in self._ledger_seen}
+        try:
+            UTILS.save_billing_ledger(self.ledger)
+        except Exception as e:
+            self.__LOGGER.error(f"Could not save billing ledger - {e}")
         
         self.__LOGGER.debug(f"Finished -- Pulling cost data from Cloud for all objects")
 
     def update_device_costs(self, start_date, end_date):
         self.__LOGGER.debug(f"Starting --- Updating cost data from Cloud for all devices")
         # OBJECT LOGIC
+        #-- Rack costs for this cycle - {rack_id_tup: {'total': , 'detailed': {<charge_type>: amount}}}
+        #-- totalled from the devices then applied to the racks, so no previous cycle's total is carried over
+        rack_costs = {}
+        device_updates = []
         #-- Loop over all billable devices and push cost data to concertim for each
         for device_id_tup, device in self.view.devices.items():
             containing_rack = self.view.racks[device.rack_id_tuple]
@@ -85,40 +135,36 @@ class BillingHandler(AbsBillingHandler):
             if not owner.id[2] or not containing_rack.id[2]:
                 self.__LOGGER.debug(f"Device {device_id_tup} is not billable - Owner:{owner.id} Containing Rack:{containing_rack.id} - skipping")
                 continue
-            cost_dict = self.clients['cloud'].get_cost(
-                obj_type='server',
-                obj_cloud_id=device_id_tup[1],
-                start=start_date,
-                stop=end_date
-            )
-            original_cost = self.view.devices[device_id_tup].cost
-            self.view.devices[device_id_tup].cost = float(cost_dict['total_cost'])
+            cost_dict = self._get_cost('server', device_id_tup[1], start_date, end_date)
+            device.cost = float(cost_dict['total_cost'])
             #-- Total device cost into containing rack cost
-            self.view.racks[containing_rack.id].cost += float(cost_dict['total_cost'])
+            rack_cost = rack_costs.get(containing_rack.id)
+            if rack_cost is None:
+                rack_cost = rack_costs[containing_rack.id] = {'total': 0.0, 'detailed': {}}
+            rack_cost['total'] += device.cost
+            detailed_cost = rack_cost['detailed']
             for charge_type, amt in cost_dict['detailed_cost'].items():
-                if charge_type in self.view.racks[containing_rack.id]._detailed_cost:
-                    self.view.racks[containing_rack.id]._detailed_cost[charge_type] += amt
+                if charge_type in detailed_cost:
+                    detailed_cost[charge_type] += amt
                 else:
-                    self.view.racks[containing_rack.id]._detailed_cost[charge_type] = amt
-
-            if original_cost == self.view.devices[device_id_tup].cost:
-                continue
+                    detailed_cost[charge_type] = amt
 
-            self.__LOGGER.debug(f"Cost changed: from {original_cost} to {self.view.devices[device_id_tup].cost}")
-            #-- Push cost to concertim
-            device =  self.view.devices[device_id_tup]
+            #-- Queue cost push to concertim - skipped by the ledger if unchanged since it was last sent
             if device.type == "Instance":
                 type = "compute_device"
             elif device.type == "Volume":
                 type = "volume_device"
             elif device.type == "Network":
                 type = "network_device"
-            self.concertim_cost_update(type, self.view.devices[device_id_tup])
+            device_updates.append((type, device))
+        self.concertim_cost_updates(device_updates)
+        self._apply_rack_costs(rack_costs)
         self.__LOGGER.debug(f"Finished --- Updating cost data from Cloud for all devices")
 
     def update_rack_costs(self, start_date, end_date):
         self.__LOGGER.debug(f"Starting --- Updating cost data from Cloud for all racks")
         # OBJECT LOGIC
+        rack_updates = []
         #-- Loop over all billable racks and push cost data to concertim and billing app for each
         for rack_id_tup, rack in self.view.racks.items():
             owner = self.view.teams[rack.team_id_tuple]
@@ -126,15 +172,17 @@ class BillingHandler(AbsBillingHandler):
                 self.__LOGGER.debug(f"Rack {rack_id_tup} is not billable - Owner:{owner.id} - skipping")
                 continue
             #-- Cost has been totalled from updating device, just need to push the final amounts to billing/concertim
-            #-- Push to concertim
-            self.concertim_cost_update('rack', rack)
+            #-- Queue push to concertim
+            rack_updates.append(('rack', rack))
             #-- Push detailed cost to billing app
             self.billing_app_cost_update(rack)
+        self.concertim_cost_updates(rack_updates)
         self.__LOGGER.debug(f"Finished --- Updating cost data from Cloud for all racks")
 
     def update_team_costs_credits(self, start_date, end_date):
         self.__LOGGER.debug(f"Starting --- Updating cost data from Cloud and billing credits for all teams")
         # OBJECT LOGIC
+        team_updates = []
         #-- Loop over all teams
         for team_id_tup in self.view.teams:
             if not team_id_tup[1] or not team_id_tup[2]:
@@ -144,12 +192,7 @@ class BillingHandler(AbsBillingHandler):
             self.view.teams[team_id_tup].billing_period_end = end_date
 
             #-- Get team cloud cost
-            team_cost_dict = self.clients['cloud'].get_cost(
-                obj_type='project',
-                obj_cloud_id=team_id_tup[1],
-                start=start_date,
-                stop=end_date
-            )
+            team_cost_dict = self._get_cost('project', team_id_tup[1], start_date, end_date)
             #-- Get team remaining credits
             team_remaining_credits = self.clients['billing'].get_credits(
                 project_billing_id=team_id_tup[2]
@@ -158,11 +201,9 @@ class BillingHandler(AbsBillingHandler):
             # Some queries return rounded costs, some not - rounding cost here makes slightly more consistent
             self.view.teams[team_id_tup].cost = math.ceil(float(team_cost_dict['total_cost']))
             self.view.teams[team_id_tup].credits = float(team_remaining_credits)
-            #-- Update team in Concertim
-            self.concertim_cost_update(
-                obj_type='team',
-                obj=self.view.teams[team_id_tup]
-            )
+            #-- Queue team update in Concertim
+            team_updates.append(('team', self.view.teams[team_id_tup]))
+        self.concertim_cost_updates(team_updates)
         self.__LOGGER.debug(f"Finished --- Updating cost data from Cloud and billing credits for all teams")
 
     def billing_app_cost_update(self, cluster_rack_obj):
@@ -171,12 +212,16 @@ class BillingHandler(AbsBillingHandler):
         """
         self.__LOGGER.debug(f"Updating cost in Billing App for {cluster_rack_obj.id}")
         for charge_type, amt in cluster_rack_obj._detailed_cost.items():
+            ledger_key = f"billing:{cluster_rack_obj.id[2]}:{charge_type}"
+            if self._already_sent(ledger_key, amt):
+                continue
             try:
                 self.clients['billing'].update_usage(
                     usage_metric_type=charge_type,
                     usage_metric_value=amt,
                     cluster_billing_id=cluster_rack_obj.id[2]
                 )
+                self._record_sent(ledger_key, amt)
             except Exception as e:
                 self.__LOGGER.error(f"FAILED - Could not update cost in Billing App for rack.{cluster_rack_obj.id} - {e} - skipping")
 
@@ -184,39 +229,36 @@ class BillingHandler(AbsBillingHandler):
         """
         Process for updating Concertim object costs.
         """
-        obj_updates = {
-            'compute_device': [
-                'cost'
-            ],
-            'volume_device': [
-                'cost'
-            ],
-            'network_device': [
-                'cost'
-            ],
-            'rack': [
-                'cost'
-            ],
-            'team': [
-                'cost',
-                'billing_period_start',
-                'billing_period_end',
-                'credits'
-            ]
-        }
-        self.__LOGGER.debug(f"Updating cost in Concertim for {obj_type}.{obj.id}")
-        if obj_type not in obj_updates:
-            raise EXCP.InvalidArguments(f"obj_type:{obj_type}")
-        v_dict = {}
-        for field in obj_updates[obj_type]:
-            v_dict[field] = getattr(obj, field)
-        try:
-            getattr(self.clients['concertim'], 'update_'+obj_type)(
-                ID=obj.id[0],
-                variables_dict=v_dict
-            )
-        except Exception as e:
-            self.__LOGGER.error(f"FAILED - Could not update cost in Concertim for {obj_type}.{obj.id} - {e} - skipping")
+        self.concertim_cost_updates([(obj_type, obj)])
+
+    def concertim_cost_updates(self, updates):
+        """
+        Process for updating the costs of many Concertim objects.
+        updates is a list of (obj_type, obj) - the changed ones are sent concurrently.
+        """
+        # OBJECT LOGIC
+        #-- Skip objects whose cost is unchanged since it was last sent
+        pending = []
+        for obj_type, obj in updates:
+            v_dict = self._concertim_cost_values(obj_type, obj)
+            ledger_key = f"concertim:{obj_type}:{obj.id[0]}"
+            if self._already_sent(ledger_key, v_dict):
+                continue
+            self.__LOGGER.debug(f"Updating cost in Concertim for {obj_type}.{obj.id}")
+            pending.append((obj_type, obj, ledger_key, v_dict))
+        if not pending:
+            return
+
+        #-- Send all updates, only recording the ones that succeeded in the ledger
+        results = asyncio.run(self.async_concertim.gather_with_semaphore([
+            getattr(self.async_concertim, 'update_'+obj_type)(ID=obj.id[0], variables_dict=v_dict)
+            for obj_type, obj, ledger_key, v_dict in pending
+        ]))
+        for (obj_type, obj, ledger_key, v_dict), result in zip(pending, results):
+            if isinstance(result, Exception):
+                self.__LOGGER.error(f"FAILED - Could not update cost in Concertim for {obj_type}.{obj.id} - {result} - skipping")
+                continue
+            self._record_sent(ledger_key, v_dict)
 
     ##############################
     # HANDLER REQUIRED FUNCTIONS #
@@ -236,9 +278,14 @@ class BillingHandler(AbsBillingHandler):
         if 'billing' not in self.clients or not self.clients['billing']:
             raise EXCP.NoClientFound('billing')
 
-        #-- Load current view
+        #-- Load current view - the current view is kept if the snapshot hasn't changed
         try:
-            self.view = UTILS.load_view()
+            new_view, generation = UTILS.load_view_if_changed(self._view_generation)
+            if new_view is not None:
+                self.view = new_view
+                self._view_generation = generation
+            else:
+                self.__LOGGER.debug(f"View generation {generation} unchanged - using current view")
         except Exception as e:
             self.__LOGGER.error(f"Could not load view - waiting for next loop - {e}")
 
@@ -246,17 +293,80 @@ class BillingHandler(AbsBillingHandler):
 
         self.__LOGGER.info(f"Finished - Updating Concertim Front-end and Billing app with Usage and Billing data")
         self.__LOGGER.info(f"=====================================================================================\n\n")
-        time.sleep(BillingHandler.BILLING_INTERVAL)
+        self.scheduler.wait_for_next_tick()
 
     def disconnect(self):
         """
         Function for disconnecting all clients before garbage collection.
         """
         self.__LOGGER.info("Disconnecting Billing Clients and Components")
+        if self.async_concertim is not None:
+            self.async_concertim.disconnect()
+            self.async_concertim = None
         for name, client in self.clients.items():
             client.disconnect()
         self.clients = None
 
     ###########################
     # BILLING HANDLER HELPERS #
-    ###########################
\ No newline at end of file
+    ###########################
+    def _apply_rack_costs(self, rack_costs):
+        # Set every billable rack's cost to this cycle's total - racks without billed devices cost 0
+        for rack_id_tup, rack in self.view.racks.items():
+            owner = self.view.teams.get(rack.team_id_tuple)
+            if not owner or not owner.id[2] or not rack_id_tup[2]:
+                continue
+            rack_cost = rack_costs.get(rack_id_tup, {'total': 0.0, 'detailed': {}})
+            rack.cost = rack_cost['total']
+            rack._detailed_cost = rack_cost['detailed']
+
+    def _concertim_cost_values(self, obj_type, obj):
+        # Return the cost fields sent to Concertim for the object type
+        obj_updates = {
+            'compute_device': [
+                'cost'
+            ],
+            'volume_device': [
+                'cost'
+            ],
+            'network_device': [
+                'cost'
+            ],
+            'rack': [
+                'cost'
+            ],
+            'team': [
+                'cost',
+                'billing_period_start',
+                'billing_period_end',
+                'credits'
+            ]
+        }
+        if obj_type not in obj_updates:
+            raise EXCP.InvalidArguments(f"obj_type:{obj_type}")
+        return {field: getattr(obj, field) for field in obj_updates[obj_type]}
+
+    def _already_sent(self, ledger_key, value):
+        # True if value is what was last sent for ledger_key, and this isn't a full flush cycle
+        self._ledger_seen.add(ledger_key)
+        if self._full_flush or ledger_key not in self.ledger:
+            return False
+        return self.ledger[ledger_key]['value'] == self._ledger_value(value)
+
+    def _record_sent(self, ledger_key, value):
+        self.ledger[ledger_key] = {'value': self._ledger_value(value), 'sent_at': time.time()}
+
+    def _ledger_value(self, value):
+        # Values are compared as they are saved to the ledger file (dates as strings)
+        return json.loads(json.dumps(value, default=str))
+
+    def _get_cost(self, obj_type, obj_cloud_id, start_date, end_date):
+        if self._cost_index is None:
+            return self.clients['cloud'].get_cost(
+                obj_type=obj_type,
+                obj_cloud_id=obj_cloud_id,
+                start=start_date,
+                stop=end_date
+            )
+        #-- Objects with no rated usage are not in the index
+        return self._cost_index[obj_type].get(obj_cloud_id, {'total_cost': 0.0, 'detailed_cost': {}})
\ No newline at end of file
@@ -32,9 +32,9 @@ from conser.utils.service_logger import create_logger
 from conser.factory.abs_classes.handlers import Handler
 import conser.exceptions as EXCP
 import conser.utils.common as UTILS
+from conser.utils.scheduler import IntervalScheduler
 
 # Py Packages
-import time
 from datetime import datetime, timedelta
 
 class MetricsHandler(Handler):
@@ -53,7 +53,8 @@ class MetricsHandler(Handler):
         self._LOG_FILE = log_file
         self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
         self.clients = clients_dict
-        self.view = None
+        self.scheduler = IntervalScheduler(MetricsHandler.METRICS_INTERVAL, self._LOG_FILE, self._LOG_LEVEL)
+        self.view_columns = None
 
     #############################
     # METRICS HANDLER FUNCTIONS #
@@ -61,7 +62,7 @@ class MetricsHandler(Handler):
 
     def update_cluster_metrics(self):
         # EXIT CASES
-        if not self.view or not self.view.devices:
+        if not self.view_columns or not self.view_columns.count('devices'):
             self.__LOGGER.info("No metrics to update, continuing at next interval")
             return
 
@@ -69,41 +70,60 @@ class MetricsHandler(Handler):
         stop = datetime.utcnow()- timedelta(seconds=1)
         start = stop - timedelta(seconds=MetricsHandler.DEFAULT_METRIC_WINDOW)
         # SERVER DEVICES
-        #-- loop over all devices in view
-        for device_id_tup, device in self.view.devices.items():
+        #-- loop over all devices in view - only the ID and type columns are read
+        server_devices = []
+        for device_concertim_id, device_cloud_id, device_type in self.view_columns.iter_rows('devices', ['concertim_id', 'cloud_id', 'type']):
+            device_id_tup = (device_concertim_id, device_cloud_id)
             #-- if both concertim and cloud id are present, get its metrics
             if not device_id_tup[0] or not device_id_tup[1]:
                 self.__LOGGER.debug(f"Skipping metrics for device {device_id_tup}")
                 continue
-            self.__LOGGER.debug(f"Starting -- Updating metrics for device {device_id_tup}")
-            if device.type != 'Instance':
+            if device_type != 'Instance':
                 self.__LOGGER.debug(f"Device is not a server and is unsupported - skipping {device_id_tup}")
                 continue
-            metrics = self.clients['cloud'].get_metrics(
-                resource_type='server',
-                resource_id=device_id_tup[1],
-                start=start,
-                stop=stop
-            )
-            self.__LOGGER.debug(f"Attemping to send metrics {metrics}")
-            #-- post metrics to concertim
+            server_devices.append(device_id_tup)
+        if not server_devices:
+            self.__LOGGER.info("No server devices to update metrics for, continuing at next interval")
+            return
+        #-- drop cached metric info for instances changed since the last interval
+        try:
+            invalidated_ids = UTILS.pop_metrics_cache_invalidations()
+            if invalidated_ids:
+                self.clients['cloud'].invalidate_metrics_cache(invalidated_ids)
+        except Exception as e:
+            self.__LOGGER.warning(f"Could not check for metrics cache invalidations - {e}")
+        #-- get metrics for all servers at once
+        all_metrics = self.clients['cloud'].get_all_metrics(
+            resource_type='server',
+            resource_ids=[device_id_tup[1] for device_id_tup in server_devices],
+            start=start,
+            stop=stop
+        )
+        #-- build all metrics to send
+        metrics_to_send = []
+        for device_id_tup in server_devices:
+            if device_id_tup[1] not in all_metrics:
+                self.__LOGGER.debug(f"No metrics found for device {device_id_tup} - skipping")
+                continue
+            metrics = all_metrics[device_id_tup[1]]
+            self.__LOGGER.debug(f"Attemping to send metrics {metrics} for device {device_id_tup}")
             for m_name, m_dict in metrics.items():
-                try:
-                    self.clients['concertim'].send_metric(
-                        ID=device_id_tup[0],
-                        variables_dict={
-                            'type': 'double',
-                            'name': m_name,
-                            'value': m_dict['value'],
-                            'units': m_dict['unit'],
-                            'slope': 'both',
-                            'ttl': 3600
-                        }
-                    )
-                except Exception as e:
-                    self.__LOGGER.error(f"FAILED - Updating metric {m_name} for device {device_id_tup} - {e}")
-                    continue
-            self.__LOGGER.debug(f"Finished -- Updating metrics for device {device_id_tup}")
+                metrics_to_send.append((device_id_tup, m_name, {
+                    'type': 'double',
+                    'name': m_name,
+                    'value': m_dict['value'],
+                    'units': m_dict['unit'],
+                    'slope': 'both',
+                    'ttl': 3600
+                }))
+        #-- post metrics to concertim concurrently
+        send_results = self.clients['concertim'].send_metrics(
+            [(device_id_tup[0], variables_dict) for device_id_tup, m_name, variables_dict in metrics_to_send]
+        )
+        for (device_id_tup, m_name, variables_dict), error in zip(metrics_to_send, send_results):
+            if error:
+                self.__LOGGER.error(f"FAILED - Updating metric {m_name} for device {device_id_tup} - {error}")
+        self.__LOGGER.debug(f"Finished -- Updating metrics for {len(server_devices)} devices")
 
     ##############################
     # HANDLER REQUIRED FUNCTIONS #
@@ -121,17 +141,22 @@ class MetricsHandler(Handler):
         if 'cloud' not in self.clients or not self.clients['cloud']:
             raise EXCP.NoClientFound('cloud')
 
-        #-- Load current view
+        #-- Open current view - metrics only need device IDs and types, so use the columnar view
         try:
-            self.view = UTILS.load_view()
+            self.view_columns = UTILS.open_columnar_view()
         except Exception as e:
             self.__LOGGER.error(f"Could not load view - waiting for next loop")
 
-        self.update_cluster_metrics()
+        try:
+            self.update_cluster_metrics()
+        finally:
+            if self.view_columns:
+                self.view_columns.close()
+                self.view_columns = None
 
         self.__LOGGER.info(f"Finished - Updating Concertim Front-end with Metrics data")
         self.__LOGGER.info(f"=====================================================================================\n\n")
-        time.sleep(MetricsHandler.METRICS_INTERVAL)
+        self.scheduler.wait_for_next_tick()
 
     def disconnect(self):
         """
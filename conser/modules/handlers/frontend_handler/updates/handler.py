@@ -32,9 +32,9 @@ from conser.utils.service_logger import create_logger
 from conser.factory.abs_classes.handlers import Handler
 import conser.exceptions as EXCP
 import conser.utils.common as UTILS
+from conser.utils.scheduler import IntervalScheduler
 
 # Py Packages
-import time
 import json
 
 class UpdatesHandler(Handler):
@@ -50,7 +50,10 @@ class UpdatesHandler(Handler):
         self._LOG_FILE = log_file
         self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
         self.clients = clients_dict
+        self.scheduler = IntervalScheduler(UpdatesHandler.UPDATES_INTERVAL, self._LOG_FILE, self._LOG_LEVEL)
         self.view = None
+        # Generation of the view snapshot self.view was loaded from - None to always load
+        self._view_generation = None
 
     #############################
     # UPDATES HANDLER FUNCTIONS #
@@ -102,7 +105,7 @@ class UpdatesHandler(Handler):
             else:
                 self.__LOGGER.warning(f"Unrecognized rack found in view {rack}")
         if new_racks:
-            UTILS.create_resync_flag()
+            UTILS.request_resync()
         self.__LOGGER.debug("Finished -- Sending racks changes")
 
     def devices_changes(self):
@@ -364,14 +367,20 @@ class UpdatesHandler(Handler):
         if 'concertim' not in self.clients or not self.clients['concertim']:
             raise EXCP.NoClientFound('concertim')
 
-        #-- Load current view
+        #-- Load current view - the current view is kept if the snapshot hasn't changed
         try:
-            self.view = UTILS.load_view()
+            new_view, generation = UTILS.load_view_if_changed(self._view_generation)
+            if new_view is not None:
+                self.view = new_view
+                self._view_generation = generation
+            else:
+                self.__LOGGER.debug(f"View generation {generation} unchanged - using current view")
         except Exception as e:
             self.__LOGGER.error(f"Could not load view - waiting for next loop")
             self.__LOGGER.exception(e)
 
         if self.view:
+            view_keys = self._view_keys()
             #-- Edit Templates
             self.templates_changes()
             #-- Edit Racks
@@ -381,18 +390,22 @@ class UpdatesHandler(Handler):
             #-- Reflect any ID changes in the keys of the view dicts
             self.view.rebuild_indices()
 
-        # Persist any ID changes we've caused by creating Concertim objects.
-        # SyncHandler will blow these away when it completes its next run but by
-        # that point the IDs should be in the Concertim source data anyway.
-        # Doing this prevents us from trying to create objects in Concertim
-        # again that we created on our previous run. Such attempts would fail
-        # and prevent any other changes from being made later in the run.
-        UTILS.save_view(self.view)
-        UTILS.merge_views()
+            # Persist any ID changes we've caused by creating Concertim objects.
+            # SyncHandler will blow these away when it completes its next run but by
+            # that point the IDs should be in the Concertim source data anyway.
+            # Doing this prevents us from trying to create objects in Concertim
+            # again that we created on our previous run. Such attempts would fail
+            # and prevent any other changes from being made later in the run.
+            # If no IDs changed there is nothing to persist, so the snapshot generation is left as is.
+            if self._view_keys() != view_keys:
+                UTILS.save_view(self.view)
+                UTILS.merge_views()
+                #-- Load the merged view next loop
+                self._view_generation = None
         
         self.__LOGGER.info(f"Finished - Updating Concertim Front-end with current View data")
         self.__LOGGER.info(f"=====================================================================================\n\n")
-        time.sleep(UpdatesHandler.UPDATES_INTERVAL)
+        self.scheduler.wait_for_next_tick()
 
     def disconnect(self):
         """
@@ -406,3 +419,7 @@ class UpdatesHandler(Handler):
     ###########################
     # UPDATES HANDLER HELPERS #
     ###########################
+    def _view_keys(self):
+        # Keys change when objects created in Concertim are given their concertim ID
+        return (set(self.view.templates), set(self.view.racks), set(self.view.devices))
+
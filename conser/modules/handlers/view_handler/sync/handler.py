@@ -43,6 +43,7 @@ from conser.modules.clients.concertim.objects.location import Location
 # Py Packages
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 class SyncHandler(AbsViewHandler):
     """
@@ -57,9 +58,11 @@ class SyncHandler(AbsViewHandler):
     ############
     # DEFAULTS #
     ############
-    # interval = 15 (resync_interval * resync_amount) to match concertim MRD polling interval
-    RESYNC_INTERVAL = 3
-    RESYNC_CHECKS_AMOUNT = 5
+    # Seconds between the end of a full sync and the next one - a backstop for changes no event reported
+    # Targeted resyncs are run in between whenever a resync notification arrives
+    FULL_SYNC_INTERVAL = 300
+    # Max number of cloud calls made in parallel when fetching cloud data
+    CLOUD_FETCH_WORKERS = 8
     # Metadata is mapped with concertim_field:middleware_field
     METADATA_MAPPING = {
         'rack': {
@@ -79,12 +82,19 @@ class SyncHandler(AbsViewHandler):
     ########
     # INIT #
     ########
-    def __init__(self, clients_dict, log_file, log_level):
+    def __init__(self, clients_dict, log_file, log_level, fetch_workers=None, full_sync_interval=None):
         self._LOG_LEVEL = log_level
         self._LOG_FILE = log_file
         self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
         self.clients = clients_dict
         self.view = None
+        self.fetch_workers = max(1, int(fetch_workers)) if fetch_workers else SyncHandler.CLOUD_FETCH_WORKERS
+        # Targets popped from the resync queue, handled at the start of the next run
+        self._resync_targets = []
+        self._last_full_sync = None
+        self.full_sync_interval = float(full_sync_interval) if full_sync_interval else float(SyncHandler.FULL_SYNC_INTERVAL)
+        # Bound now so notifications sent during the first sync are not missed
+        self._resync_listener = UTILS.create_resync_listener(self._LOG_FILE, self._LOG_LEVEL)
 
     ##########################
     # SYNC HANDLER FUNCTIONS #
@@ -99,6 +109,24 @@ class SyncHandler(AbsViewHandler):
         self.layer_cloud_devices()
         self.__LOGGER.info(f"Finished - Populating Cloud Data")
 
+    def pull_targeted_cloud_data(self, targets):
+        """
+        Layer cloud data onto the view for only the given (target_type, target_id) list.
+        Stacks in a targeted project are included with that project.
+        """
+        self.__LOGGER.info(f"Starting - Populating Cloud Data for {len(targets)} targets")
+        project_ids = [t_id for t_type, t_id in targets if t_type == 'project']
+        cluster_ids = [t_id for t_type, t_id in targets if t_type == 'stack']
+        server_ids = [t_id for t_type, t_id in targets if t_type == 'server']
+        if project_ids:
+            for cluster_cloud_id, project_cloud_id in self.clients['cloud'].get_all_cluster_ids()['clusters'].items():
+                if project_cloud_id in project_ids and cluster_cloud_id not in cluster_ids:
+                    cluster_ids.append(cluster_cloud_id)
+        self.layer_cloud_racks(cluster_ids=cluster_ids)
+        self.layer_cloud_devices(project_ids=project_ids, cluster_ids=cluster_ids)
+        self.layer_cloud_servers(server_ids)
+        self.__LOGGER.info(f"Finished - Populating Cloud Data for {len(targets)} targets")
+
     def pull_concertim_view(self):
         self.__LOGGER.info(f"Starting - Populating Concertim View")
         self.fetch_concertim_teams()
@@ -346,7 +374,10 @@ class SyncHandler(AbsViewHandler):
             self.create_template_from_cloud(cloud_template_dict)
         self.__LOGGER.debug("Finished -- Layering Cloud Templates onto existing View")
 
-    def layer_cloud_racks(self):
+    def layer_cloud_racks(self, cluster_ids=None):
+        """
+        Layer all cloud clusters onto the view, or only the clusters in cluster_ids if given.
+        """
         self.__LOGGER.debug("Starting -- Layering Cloud Racks onto existing View")
         # EXIT CONDITIONS
         create_all = False
@@ -359,9 +390,14 @@ class SyncHandler(AbsViewHandler):
             create_all = True
 
         # OBJECT LOGIC
-        #-- Getting all racks (clusters) 
-        cloud_clusters_dict = self.clients['cloud'].get_all_clusters()
-        for cluster_cloud_id, cloud_cluster_dict in cloud_clusters_dict['clusters'].items():
+        #-- Getting all racks (clusters) - cluster info is fetched in parallel
+        if cluster_ids is None:
+            cluster_ids = list(self.clients['cloud'].get_all_cluster_ids()['clusters'].keys())
+        cloud_cluster_infos = self._fetch_concurrently(
+            lambda cluster_cloud_id: self.clients['cloud'].get_cluster_info(cluster_cloud_id=cluster_cloud_id),
+            cluster_ids
+        )
+        for cluster_cloud_id, cloud_cluster_dict in zip(cluster_ids, cloud_cluster_infos):
             #---- Check if the cluster cloud data matches an already existing concertim rack
             #------ if so, move to update instead of create
             if not create_all:
@@ -378,7 +414,12 @@ class SyncHandler(AbsViewHandler):
             self.create_rack_from_cloud(cloud_cluster_dict)
         self.__LOGGER.debug("Finished -- Layering Cloud Racks onto existing View")
 
-    def layer_cloud_devices(self):
+    def layer_cloud_devices(self, project_ids=None, cluster_ids=None):
+        """
+        Layer the servers and stack devices of all CM projects onto the view.
+        If project_ids or cluster_ids are given, only the servers and stacks of project_ids
+        and the stacks in cluster_ids are layered.
+        """
         self.__LOGGER.debug("Starting -- Layering Cloud Devices onto existing View")
         # EXIT CONDITIONS
         create_all = False
@@ -388,7 +429,7 @@ class SyncHandler(AbsViewHandler):
             self.__LOGGER.warning("Warning --- No existing Devices found in view - Creating all new devices from cloud data")
             create_all = True
 
-        def action_device(resource, create_all):
+        def action_device(resource, cluster_cloud_id, create_all):
             if not create_all:
                 existing_resource = self.view.search(
                     object_type='device',
@@ -400,13 +441,34 @@ class SyncHandler(AbsViewHandler):
                     return
             self._create_device_from_cloud(resource, cluster_cloud_id)
 
+        # FETCH LOGIC
+        #-- Cloud calls for every project and stack are made in parallel
+        #-- the view is only changed in the single-threaded object logic below
+        if project_ids is None and cluster_ids is None:
+            cm_projects_list = list(self.clients['cloud'].get_all_cm_projects()['projects'])
+        else:
+            cm_projects_list = list(project_ids or [])
+        #-- Targeted stacks are layered on their own after the projects
+        other_cluster_ids = list(cluster_ids or [])
+        project_servers = self._fetch_concurrently(
+            lambda project_cloud_id: self.clients['cloud'].get_all_servers(project_cloud_id=project_cloud_id),
+            cm_projects_list
+        )
+        project_clusters = {project_cloud_id: [] for project_cloud_id in cm_projects_list}
+        if cm_projects_list:
+            for cluster_cloud_id, project_cloud_id in self.clients['cloud'].get_all_cluster_ids()['clusters'].items():
+                if project_cloud_id in project_clusters and cluster_cloud_id not in other_cluster_ids:
+                    project_clusters[project_cloud_id].append(cluster_cloud_id)
+        all_cluster_ids = [cluster_cloud_id for project_cloud_id in cm_projects_list for cluster_cloud_id in project_clusters[project_cloud_id]]
+        all_cluster_ids.extend(other_cluster_ids)
+        cluster_resources = dict(zip(
+            all_cluster_ids,
+            self._fetch_concurrently(self._fetch_cluster_device_resources, all_cluster_ids)
+        ))
+
         # OBJECT LOGIC
-        #-- Getting all Concertim Managed projects
-        cm_projects_list = self.clients['cloud'].get_all_cm_projects()
-        for project_cloud_id in cm_projects_list['projects']:
+        for project_cloud_id, cloud_servers_dict in zip(cm_projects_list, project_servers):
             ## SERVER DEVICES LOGIC
-            #---- For each project, get all servers (devices)
-            cloud_servers_dict = self.clients['cloud'].get_all_servers(project_cloud_id=project_cloud_id)
             for server_cloud_id, cloud_server_dict in cloud_servers_dict['servers'].items():
                 #------ Check if the server cloud data matches an already existing concertim device
                 #-------- if so, move to update instead of create
@@ -422,34 +484,40 @@ class SyncHandler(AbsViewHandler):
                 #------ If reaching here then need to create a new ConcertimDevice from cloud data
                 self.create_server_device_from_cloud(cloud_server_dict)
 
-            cloud_clusters_dict = self.clients['cloud'].get_all_clusters(project_cloud_id=project_cloud_id)
-            for cluster_cloud_id in cloud_clusters_dict['clusters'].keys():
-                try:
-                    resources = self.clients['cloud'].get_all_stack_resources(stack_id=cluster_cloud_id)
-                except EXCP.MissingCloudObject as e:
-                    # stack and/or resource groups can be missing if creation fails
-                    self.__LOGGER.debug(f"Unable to find stack {cluster_cloud_id} - skipping")
-                    continue
-                for resource in resources:
-                    if resource.resource_type == "OS::Heat::ResourceGroup":
-                        try:
-                            group_resources = self.clients['cloud'].get_all_stack_resources(resource.physical_resource_id)
-                        except EXCP.MissingCloudObject as e:
-                            self.__LOGGER.debug(f"Unable to find resources for {resource.physical_resource_id} - skipping")
-                            continue
-                        for nested_resource in group_resources:
-                            try:
-                                devices = self.clients['cloud'].get_all_stack_resources(nested_resource.physical_resource_id)
-                            except EXCP.MissingCloudObject as e:
-                                self.__LOGGER.debug(f"Unable to find resources for {nested_resource.physical_resource_id} - skipping")
-                                continue
-                            for d in devices:
-                                action_device(d, create_all)
-                    else:
-                        action_device(resource, create_all)
+            ## STACK RESOURCE DEVICES LOGIC
+            for cluster_cloud_id in project_clusters[project_cloud_id]:
+                for resource in cluster_resources[cluster_cloud_id]:
+                    action_device(resource, cluster_cloud_id, create_all)
+
+        for cluster_cloud_id in other_cluster_ids:
+            for resource in cluster_resources[cluster_cloud_id]:
+                action_device(resource, cluster_cloud_id, create_all)
 
         self.__LOGGER.debug("Finished -- Layering Cloud Devices onto existing View")
 
+    def layer_cloud_servers(self, server_ids):
+        self.__LOGGER.debug("Starting -- Layering Cloud Servers onto existing View")
+        # EXIT CONDITIONS
+        if 'cloud' not in self.clients or not self.clients['cloud']:
+            raise EXCP.NoClientFound('cloud')
+
+        # OBJECT LOGIC
+        cloud_server_dicts = self._fetch_concurrently(
+            lambda server_cloud_id: self.clients['cloud'].get_server_info(server_cloud_id=server_cloud_id),
+            server_ids
+        )
+        for server_cloud_id, cloud_server_dict in zip(server_ids, cloud_server_dicts):
+            matching_device = self.view.search(
+                object_type='device',
+                id_value=server_cloud_id,
+                id_origin='cloud'
+            )
+            if matching_device:
+                self.update_server_device_from_cloud(cloud_server_dict, matching_device.id)
+                continue
+            self.create_server_device_from_cloud(cloud_server_dict)
+        self.__LOGGER.debug("Finished -- Layering Cloud Servers onto existing View")
+
     def create_template_from_cloud(self, template_dict):
         # EXIT CONDITIONS
         if not template_dict:
@@ -701,17 +769,17 @@ class SyncHandler(AbsViewHandler):
             self.view.devices[device_id_tup]._updated = True
 
         # One is a string of an array, the other an array
-        if eval(con_device.details['volume_details']) != server_dict['volumes']:
-            self.__LOGGER.debug(f"Volume details have changed: {eval(con_device.details['volume_details'])} to {server_dict['volumes']}")
+        if self._details_list(con_device.details['volume_details']) != server_dict['volumes']:
+            self.__LOGGER.debug(f"Volume details have changed: {self._details_list(con_device.details['volume_details'])} to {server_dict['volumes']}")
             self.view.devices[device_id_tup].details['volume_details'] = server_dict['volumes']
             self.view.devices[device_id_tup]._updated = True
 
-        if eval(con_device.details['public_ips']) != server_dict['public_ips']:
-            self.__LOGGER.debug(f"Public ips have changed: {eval(con_device.details['public_ips'])} to {server_dict['public_ips']}")
+        if self._details_list(con_device.details['public_ips']) != server_dict['public_ips']:
+            self.__LOGGER.debug(f"Public ips have changed: {self._details_list(con_device.details['public_ips'])} to {server_dict['public_ips']}")
             self.view.devices[device_id_tup].details['public_ips'] = server_dict['public_ips']
             self.view.devices[device_id_tup]._updated = True
 
-        if eval(con_device.details['private_ips']) != server_dict['private_ips']:
+        if self._details_list(con_device.details['private_ips']) != server_dict['private_ips']:
             self.__LOGGER.debug(f"Private ips have changed: {con_device.details['private_ips']} to {server_dict['private_ips']}")
             self.view.devices[device_id_tup].details['private_ips'] = server_dict['private_ips']
             self.view.devices[device_id_tup]._updated = True
@@ -849,14 +917,42 @@ class SyncHandler(AbsViewHandler):
         """
         The main running loop of the Handler.
         """
+        targets = self._resync_targets
+        self._resync_targets = []
+        if self._full_sync_due() or ('full', None) in targets:
+            self.run_full_sync()
+        elif targets:
+            try:
+                self.run_targeted_sync(targets)
+            except Exception as e:
+                self.__LOGGER.error(f"Targeted sync failed - falling back to full sync - {type(e).__name__} - {e}")
+                self.run_full_sync()
+        # Sleep until notified of a resync or the full sync backstop is due
+        if self._resync_listener.wait(self._full_sync_wait()):
+            self._resync_targets = UTILS.pop_resync_targets()
+            self.__LOGGER.info(f"RESYNC NOTIFICATION RECEIVED - starting sync process for {len(self._resync_targets)} targets")
+
+    def run_full_sync(self):
         self.__LOGGER.info(f"=====================================================================================")
         self.__LOGGER.info(f"Starting - Full Cloud + Concertim mapping for View object")
+        # Anything queued so far is covered by this sync
+        UTILS.pop_resync_targets()
         # Start with empty view
         self.view = ConcertimView()
         # Add existing concertim data to view
         self.pull_concertim_view()
+        # Index billing orders/accounts by cloud ID for the rack lookups - only reloaded once expired
+        try:
+            self.clients['billing'].load_billing_index()
+        except Exception as e:
+            self.__LOGGER.warning(f"Could not load billing index - looking up billing info per rack - {type(e).__name__} - {e}")
         # Add cloud data ontop of concertim data - updating stale concertim values with new cloud data
-        self.pull_cloud_data()
+        #-- Heat resource trees are cached for this cycle only
+        self.clients['cloud'].start_stack_resources_cache()
+        try:
+            self.pull_cloud_data()
+        finally:
+            self.clients['cloud'].stop_stack_resources_cache()
         # Save view
         self.__LOGGER.info("Saving View")
         UTILS.save_view(self.view)
@@ -864,27 +960,36 @@ class SyncHandler(AbsViewHandler):
         # process finished - merge all saved views
         self.__LOGGER.debug(f"Merging saved views")
         UTILS.merge_views()
-        # Check for resyncs
-        for i in range(SyncHandler.RESYNC_CHECKS_AMOUNT):
-            self.__LOGGER.debug(f".....Checking for resync.....")
-            if UTILS.check_resync_flag():
-                self.__LOGGER.info(f"RESYNC FLAG FOUND - Deleting resync.flag and starting full sync process")
-                UTILS.delete_resync_flag()
-                return
-            if UTILS.check_resync_hold():
-                self.__LOGGER.debug(f"RESYNC HOLD FOUND - Waiting for hold to finish and resync.flag to appear")
-                i -= 1
-                time.sleep(0.2)
-                continue
-            time.sleep(SyncHandler.RESYNC_INTERVAL)
+        self._last_full_sync = time.monotonic()
         self.__LOGGER.info(f"Finished - Full Cloud + Concertim mapping for View object")
         self.__LOGGER.info(f"=====================================================================================\n\n")
 
+    def run_targeted_sync(self, targets):
+        """
+        Re-layer the cloud data for only the given targets onto the currently published view.
+        """
+        self.__LOGGER.info(f"=====================================================================================")
+        self.__LOGGER.info(f"Starting - Targeted Cloud mapping for View object - {targets}")
+        self.view = UTILS.load_view()
+        self.clients['cloud'].start_stack_resources_cache()
+        try:
+            self.pull_targeted_cloud_data(targets)
+        finally:
+            self.clients['cloud'].stop_stack_resources_cache()
+        self.__LOGGER.info("Saving View")
+        UTILS.save_view(self.view)
+        self.__LOGGER.info("View Successfully Saved")
+        self.__LOGGER.debug(f"Merging saved views")
+        UTILS.merge_views()
+        self.__LOGGER.info(f"Finished - Targeted Cloud mapping for View object")
+        self.__LOGGER.info(f"=====================================================================================\n\n")
+
     def disconnect(self):
         """
         Function for disconnecting all clients before garbage collection.
         """
         self.__LOGGER.info("Disconnecting Sync Clients and Components")
+        self._resync_listener.close()
         for name, client in self.clients.items():
             client.disconnect()
         self.clients = None
@@ -892,7 +997,65 @@ class SyncHandler(AbsViewHandler):
     ########################
     # SYNC HANDLER HELPERS #
     ########################
+    def _full_sync_due(self):
+        return self._full_sync_wait() <= 0
+
+    def _full_sync_wait(self):
+        # Seconds until the next full sync backstop is due
+        # Full syncs are stamped when they finish, so targeted syncs get the whole interval in between
+        if self._last_full_sync is None:
+            return 0
+        return self._last_full_sync + self.full_sync_interval - time.monotonic()
+
+    def _fetch_cluster_device_resources(self, cluster_cloud_id):
+        """
+        Return the device resources of a stack in the order they are listed,
+        with resources in ResourceGroups expanded two levels deep.
+        """
+        device_resources = []
+        try:
+            resources = self.clients['cloud'].get_all_stack_resources(stack_id=cluster_cloud_id)
+        except EXCP.MissingCloudObject as e:
+            # stack and/or resource groups can be missing if creation fails
+            self.__LOGGER.debug(f"Unable to find stack {cluster_cloud_id} - skipping")
+            return device_resources
+        for resource in resources:
+            if resource.resource_type == "OS::Heat::ResourceGroup":
+                try:
+                    group_resources = self.clients['cloud'].get_all_stack_resources(resource.physical_resource_id)
+                except EXCP.MissingCloudObject as e:
+                    self.__LOGGER.debug(f"Unable to find resources for {resource.physical_resource_id} - skipping")
+                    continue
+                for nested_resource in group_resources:
+                    try:
+                        devices = self.clients['cloud'].get_all_stack_resources(nested_resource.physical_resource_id)
+                    except EXCP.MissingCloudObject as e:
+                        self.__LOGGER.debug(f"Unable to find resources for {nested_resource.physical_resource_id} - skipping")
+                        continue
+                    device_resources.extend(devices)
+            else:
+                device_resources.append(resource)
+        return device_resources
+
+    def _fetch_concurrently(self, fetch_func, items):
+        """
+        Call fetch_func for each item using up to self.fetch_workers threads.
+        Results are returned in the same order as items, and the first exception
+        raised by any call is re-raised.
+        """
+        items = list(items)
+        if self.fetch_workers <= 1 or len(items) <= 1:
+            return [fetch_func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.fetch_workers, len(items))) as executor:
+            futures = [executor.submit(fetch_func, item) for item in items]
+            return [future.result() for future in futures]
     
+    def _details_list(self, value):
+        # Details pulled from Concertim hold a string of the list, details set from cloud data hold the list
+        if isinstance(value, str):
+            return eval(value)
+        return value
+
     def _get_output_as_string(self, output_list):
         output_str = ''
         for output_tup in output_list:
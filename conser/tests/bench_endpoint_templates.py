@@ -0,0 +1,101 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Micro-benchmark of request body building - compiled ENDPOINTS templates vs the
+# previous recursive template walk. Also checks both give the same bodies.
+#
+#   python -m conser.tests.bench_endpoint_templates
+
+# Local Imports
+from conser.modules.clients.concertim.utils.endpoints import ENDPOINTS
+from conser.modules.clients.concertim.utils.templates import COMPILED_TEMPLATES, OMIT_IF_MISSING_ENDPOINTS, build_data
+
+# Py Packages
+import re
+import timeit
+
+ITERATIONS = 20000
+
+def recursive_get_data(variables_dict, data_template, endpoint_name):
+    # Previous ConcertimClient.__get_data implementation
+    data_dict = {}
+    casting = {'value': float, 'ttl': int}
+    for key, value in data_template.items():
+        if isinstance(value, dict):
+            data_dict[key] = recursive_get_data(variables_dict, value, endpoint_name)
+            if key == 'metadata' and not data_dict['metadata']:
+                del data_dict['metadata']
+        else:
+            if key in casting:
+                data_dict[key] = casting[key](value.format(**variables_dict))
+            elif value.replace('{','').replace('}','') not in variables_dict and endpoint_name in OMIT_IF_MISSING_ENDPOINTS:
+                continue
+            else:
+                data_dict[key] = value.format(**variables_dict)
+    return data_dict
+
+def template_variables(data_template, drop_every_other=False):
+    # Variables for every placeholder in the template - optionally leaving out every
+    # other one, to exercise the UPDATE_* omit-if-missing rule
+    names = []
+    def collect(template):
+        for key, value in template.items():
+            if isinstance(value, dict):
+                collect(value)
+            else:
+                names.extend((key, name) for name in re.findall(r'\{(\w+)\}', value))
+    collect(data_template)
+    variables = {}
+    for i, (key, name) in enumerate(names):
+        if drop_every_other and i % 2:
+            continue
+        variables[name] = 3600 if key == 'ttl' else 1.5 if key == 'value' else f"{name}-value"
+    return variables
+
+def main():
+    endpoints = {
+        name: endpoint
+        for method in ENDPOINTS.values()
+        for name, endpoint in method['endpoints'].items()
+        if 'data' in endpoint
+    }
+    for name, endpoint in endpoints.items():
+        variables = template_variables(endpoint['data'], name in OMIT_IF_MISSING_ENDPOINTS)
+        assert recursive_get_data(variables, endpoint['data'], name) == build_data(COMPILED_TEMPLATES[name], variables), name
+
+    print(f"{'endpoint':<24}{'recursive (us)':>16}{'compiled (us)':>16}{'speedup':>10}")
+    for name in ['METRIC', 'CREATE_COMPUTE_DEVICE', 'UPDATE_COMPUTE_DEVICE', 'UPDATE_RACK']:
+        endpoint = endpoints[name]
+        variables = template_variables(endpoint['data'], name in OMIT_IF_MISSING_ENDPOINTS)
+        recursive = timeit.timeit(lambda: recursive_get_data(variables, endpoint['data'], name), number=ITERATIONS)
+        compiled = timeit.timeit(lambda: build_data(COMPILED_TEMPLATES[name], variables), number=ITERATIONS)
+        print(f"{name:<24}{recursive / ITERATIONS * 1e6:>16.2f}{compiled / ITERATIONS * 1e6:>16.2f}{recursive / compiled:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
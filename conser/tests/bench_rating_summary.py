@@ -0,0 +1,99 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Benchmark of grouping an all-tenant rating summary by tenant - the single pass
+# group_rating_summary_by_tenant vs the previous loop over every row per tenant.
+# Also checks both give the same result.
+#
+#   python -m conser.tests.bench_rating_summary [tenants] [rows]
+#
+# The previous loop is O(tenants x rows), so it is timed on a sample of the
+# tenants and scaled up to the full tenant count.
+
+# Local Imports
+from conser.modules.clients.cloud.openstack.components.cloudkitty import group_rating_summary_by_tenant
+
+# Py Packages
+import sys
+import random
+import timeit
+
+TENANTS = 10000
+ROWS = 50000
+LEGACY_SAMPLE_TENANTS = 100
+RES_TYPES = ['instance', 'volume', 'network.bw.in', 'network.bw.out', 'image']
+
+def legacy_group(rating_summary, tenants):
+    # Previous CloudkittyComponent.get_rating_summary_all implementation
+    all_tenants_rating_summary = {}
+    for tenant in tenants:
+        for usage in rating_summary:
+            if usage["tenant_id"] == str(tenant):
+                if str(tenant) in all_tenants_rating_summary:
+                    all_tenants_rating_summary[str(tenant)].append(usage)
+                else:
+                    all_tenants_rating_summary[str(tenant)] = [usage]
+    return all_tenants_rating_summary
+
+def make_summary(tenant_count, row_count):
+    rand = random.Random(42)
+    tenants = [f"{i:032x}" for i in range(tenant_count)]
+    # Include rows for tenants that were not asked for
+    summary_tenants = tenants + [f"{i:032x}" for i in range(tenant_count, tenant_count + tenant_count // 10 + 1)]
+    summary = [
+        {
+            "tenant_id": rand.choice(summary_tenants),
+            "res_type": rand.choice(RES_TYPES),
+            "rate": str(round(rand.random() * 10, 4)),
+            "begin": "2024-01-01T00:00:00",
+            "end": "2024-02-01T00:00:00"
+        }
+        for i in range(row_count)
+    ]
+    return tenants, summary
+
+def main():
+    tenant_count = int(sys.argv[1]) if len(sys.argv) > 1 else TENANTS
+    row_count = int(sys.argv[2]) if len(sys.argv) > 2 else ROWS
+
+    check_tenants, check_summary = make_summary(200, 2000)
+    check_tenants.append(check_tenants[0])
+    assert legacy_group(check_summary, check_tenants) == group_rating_summary_by_tenant(check_summary, check_tenants)
+
+    tenants, summary = make_summary(tenant_count, row_count)
+    sample = tenants[:LEGACY_SAMPLE_TENANTS]
+    legacy = timeit.timeit(lambda: legacy_group(summary, sample), number=1) * len(tenants) / len(sample)
+    grouped = min(timeit.repeat(lambda: group_rating_summary_by_tenant(summary, tenants), number=1, repeat=5))
+    print(f"{tenant_count} tenants x {row_count} rows")
+    print(f"{'previous loop (s, scaled)':<28}{legacy:>12.3f}")
+    print(f"{'single pass (s)':<28}{grouped:>12.3f}")
+    print(f"{'speedup':<28}{legacy / grouped:>11.0f}x")
+
+if __name__ == '__main__':
+    main()
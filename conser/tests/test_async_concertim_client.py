@@ -0,0 +1,154 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Checks the AsyncConcertimClient returns results in order, keeps to its
+# concurrency limit, returns exceptions in place, and that calls go through
+# the wrapped ConcertimClient's 401 re-authentication.
+#
+#   python -m pytest conser/tests/test_async_concertim_client.py
+
+# Local Imports
+from conser.modules.clients.concertim.async_client import AsyncConcertimClient
+from conser.modules.clients.concertim.client import ConcertimClient
+
+# Py Packages
+import os
+import time
+import shutil
+import random
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import requests
+
+class FakeConcertimClient(object):
+    # Sleeps in update_rack and tracks how many calls are running at once
+    metrics_workers = 8
+
+    def __init__(self, fail_ids=()):
+        self.fail_ids = set(fail_ids)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def update_rack(self, ID, variables_dict):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(random.uniform(0.005, 0.02))
+            if ID in self.fail_ids:
+                raise ValueError(f"rack {ID} failed")
+            return {'id': ID, 'cost': variables_dict['cost']}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+def make_response(status_code, json_body=None, headers=None):
+    response = mock.MagicMock(status_code=status_code, headers=headers or {})
+    response.json.return_value = json_body
+    return response
+
+
+class AsyncConcertimClientTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.data_dir, 'async.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def gather_updates(self, async_client, rack_ids, limit=None):
+        return asyncio.run(async_client.gather_with_semaphore(
+            [async_client.update_rack(ID=rack_id, variables_dict={'cost': float(rack_id)}) for rack_id in rack_ids],
+            limit=limit
+        ))
+
+    def test_results_are_in_order(self):
+        async_client = AsyncConcertimClient(FakeConcertimClient(), self.log_file, 'DEBUG')
+        rack_ids = list(range(40))
+        results = self.gather_updates(async_client, rack_ids)
+        self.assertEqual([result['id'] for result in results], rack_ids)
+        async_client.disconnect()
+
+    def test_concurrency_is_limited(self):
+        client = FakeConcertimClient()
+        async_client = AsyncConcertimClient(client, self.log_file, 'DEBUG', max_concurrency=3)
+        self.gather_updates(async_client, range(30))
+        self.assertEqual(client.max_in_flight, 3)
+
+        client.max_in_flight = 0
+        self.gather_updates(async_client, range(30), limit=2)
+        self.assertEqual(client.max_in_flight, 2)
+        async_client.disconnect()
+
+    def test_exceptions_are_returned_in_place(self):
+        async_client = AsyncConcertimClient(FakeConcertimClient(fail_ids={3, 7}), self.log_file, 'DEBUG')
+        results = self.gather_updates(async_client, range(10))
+        for rack_id, result in enumerate(results):
+            if rack_id in (3, 7):
+                self.assertIsInstance(result, ValueError)
+            else:
+                self.assertEqual(result['id'], rack_id)
+        async_client.disconnect()
+
+    def test_unauthorized_call_is_retried_after_login(self):
+        logins = []
+        sent_tokens = []
+
+        def post(session, url, headers=None, data=None, verify=True):
+            logins.append(url)
+            return make_response(200, headers={'Authorization': f"Bearer token-{len(logins)}"})
+
+        def patch(session, url, headers=None, data=None, verify=True):
+            sent_tokens.append(headers['Authorization'])
+            if headers['Authorization'] == 'Bearer token-1':
+                return make_response(401)
+            return make_response(200, json_body={'id': 10})
+
+        config = {
+            'concertim_url': f"https://concertim-{id(self)}.test",
+            'concertim_username': 'admin',
+            'concertim_password': 'password'
+        }
+        with mock.patch.object(requests.Session, 'post', post), mock.patch.object(requests.Session, 'patch', patch):
+            client = ConcertimClient(config, self.log_file, 'DEBUG')
+            async_client = AsyncConcertimClient(client, self.log_file, 'DEBUG')
+            result = asyncio.run(async_client.update_rack(ID=10, variables_dict={'cost': 1.0}))
+            async_client.disconnect()
+            client.disconnect()
+
+        self.assertEqual(result, {'id': 10})
+        self.assertEqual(len(logins), 2)
+        self.assertEqual(sent_tokens, ['Bearer token-1', 'Bearer token-2'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Checks the BillingHandler ledger only pushes costs that changed since they
+# were last sent, and keeps the entries of unchanged objects between cycles.
+#
+#   python -m pytest conser/tests/test_billing_ledger.py
+
+# Local Imports
+import conser.app_definitions as app_paths
+import conser.utils.common as UTILS
+from conser.modules.handlers.billing_handler.handler import BillingHandler
+from conser.modules.clients.concertim.objects.view import ConcertimView
+from conser.modules.clients.concertim.objects.team import ConcertimTeam
+from conser.modules.clients.concertim.objects.rack import ConcertimRack
+from conser.modules.clients.concertim.objects.device import ConcertimDevice
+
+# Py Packages
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+PUSH_CALLS = ['update_compute_device', 'update_rack', 'update_team']
+
+def make_view(device_cost):
+    # A view as loaded each cycle, holding the costs Concertim currently has
+    view = ConcertimView()
+    team = ConcertimTeam(concertim_id=1, cloud_id='project-1', billing_id='account-1')
+    view.add_team(team)
+    rack = ConcertimRack(concertim_id=10, cloud_id='stack-1', billing_id='sub-1', team_id_tuple=team.id)
+    view.add_rack(rack)
+    device = ConcertimDevice(concertim_id=100, cloud_id='server-1', type='Instance', rack_id_tuple=rack.id, cost=device_cost)
+    view.add_device(device)
+    return view
+
+def make_costs(server_cost):
+    return {
+        'server': {'server-1': {'total_cost': server_cost, 'detailed_cost': {'instance': server_cost}}},
+        'project': {'project-1': {'total_cost': server_cost, 'detailed_cost': {'instance': server_cost}}}
+    }
+
+
+class BillingLedgerTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.data_dir_patch = mock.patch.object(app_paths, 'DATA_DIR', self.data_dir + os.sep)
+        self.data_dir_patch.start()
+        self.log_file = os.path.join(self.data_dir, 'billing.log')
+        self.clients = {
+            'concertim': mock.MagicMock(metrics_workers=4),
+            'cloud': mock.MagicMock(),
+            'billing': mock.MagicMock()
+        }
+        self.clients['cloud'].get_all_costs.return_value = make_costs(5.0)
+        self.clients['billing'].get_credits.return_value = {'amount': 100}
+
+    def tearDown(self):
+        self.data_dir_patch.stop()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def run_cycle(self, handler, device_cost=5.0):
+        for client in self.clients.values():
+            client.reset_mock()
+        handler.view = make_view(device_cost)
+        handler.pull_cost_data()
+        pushes = {name: getattr(self.clients['concertim'], name).call_count for name in PUSH_CALLS}
+        pushes['update_usage'] = self.clients['billing'].update_usage.call_count
+        return pushes
+
+    def test_unchanged_costs_are_not_pushed_again(self):
+        handler = BillingHandler(self.clients, self.log_file, 'DEBUG', full_flush_cycles=0)
+        first_pushes = self.run_cycle(handler)
+        self.assertEqual(first_pushes, {'update_compute_device': 1, 'update_rack': 1, 'update_team': 1, 'update_usage': 1})
+        first_ledger = UTILS.load_billing_ledger()
+        self.assertIn('concertim:compute_device:100', first_ledger)
+
+        second_pushes = self.run_cycle(handler)
+        self.assertEqual(second_pushes, {'update_compute_device': 0, 'update_rack': 0, 'update_team': 0, 'update_usage': 0})
+        self.assertEqual(UTILS.load_billing_ledger(), first_ledger)
+
+    def test_ledger_survives_restart(self):
+        self.run_cycle(BillingHandler(self.clients, self.log_file, 'DEBUG', full_flush_cycles=0))
+        self.run_cycle(BillingHandler(self.clients, self.log_file, 'DEBUG', full_flush_cycles=0))
+        restarted_pushes = self.run_cycle(BillingHandler(self.clients, self.log_file, 'DEBUG', full_flush_cycles=0))
+        self.assertEqual(restarted_pushes, {'update_compute_device': 0, 'update_rack': 0, 'update_team': 0, 'update_usage': 0})
+
+    def test_restart_with_default_full_flush_does_not_resend(self):
+        self.run_cycle(BillingHandler(self.clients, self.log_file, 'DEBUG'))
+        restarted_pushes = self.run_cycle(BillingHandler(self.clients, self.log_file, 'DEBUG'))
+        self.assertEqual(restarted_pushes, {'update_compute_device': 0, 'update_rack': 0, 'update_team': 0, 'update_usage': 0})
+
+    def test_full_flush_resends_unchanged_costs(self):
+        handler = BillingHandler(self.clients, self.log_file, 'DEBUG', full_flush_cycles=3)
+        pushes = [self.run_cycle(handler)['update_compute_device'] for cycle in range(6)]
+        self.assertEqual(pushes, [1, 0, 1, 0, 0, 1])
+
+    def test_changed_cost_is_pushed(self):
+        handler = BillingHandler(self.clients, self.log_file, 'DEBUG', full_flush_cycles=0)
+        self.run_cycle(handler)
+        self.clients['cloud'].get_all_costs.return_value = make_costs(7.0)
+        pushes = self.run_cycle(handler)
+        self.assertEqual(pushes['update_compute_device'], 1)
+        self.assertEqual(pushes['update_usage'], 1)
+        self.assertEqual(UTILS.load_billing_ledger()['concertim:compute_device:100']['value'], {'cost': 7.0})
+
+    def test_failed_push_is_not_recorded(self):
+        handler = BillingHandler(self.clients, self.log_file, 'DEBUG', full_flush_cycles=0)
+        self.clients['concertim'].update_compute_device.side_effect = Exception('concertim unavailable')
+        self.run_cycle(handler)
+        ledger = UTILS.load_billing_ledger()
+        self.assertNotIn('concertim:compute_device:100', ledger)
+        self.assertIn('concertim:rack:10', ledger)
+
+        self.clients['concertim'].update_compute_device.side_effect = None
+        pushes = self.run_cycle(handler)
+        self.assertEqual(pushes['update_compute_device'], 1)
+        self.assertEqual(pushes['update_rack'], 0)
+        self.assertIn('concertim:compute_device:100', UTILS.load_billing_ledger())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Checks the updates and billing handlers only unpickle the view snapshot when
+# its generation has changed since they last loaded it.
+#
+#   python -m pytest conser/tests/test_view_generation.py
+
+# Local Imports
+import conser.app_definitions as app_paths
+import conser.utils.common as UTILS
+from conser.modules.handlers.frontend_handler.updates.handler import UpdatesHandler
+from conser.modules.handlers.billing_handler.handler import BillingHandler
+from conser.modules.clients.concertim.objects.view import ConcertimView
+from conser.modules.clients.concertim.objects.team import ConcertimTeam
+from conser.modules.clients.concertim.objects.rack import ConcertimRack
+
+# Py Packages
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+def publish_view(new_rack=False):
+    view = ConcertimView()
+    team = ConcertimTeam(concertim_id=1, cloud_id='project-1', billing_id='account-1')
+    view.add_team(team)
+    rack = ConcertimRack(concertim_id=10, cloud_id='stack-1', billing_id='sub-1', team_id_tuple=team.id)
+    rack._delete_marker = False
+    view.add_rack(rack)
+    if new_rack:
+        rack = ConcertimRack(concertim_id=None, cloud_id='stack-2', billing_id='sub-2', team_id_tuple=team.id)
+        rack.metadata['creator_cloud_name'] = 'CM_user'
+        rack._delete_marker = False
+        view.add_rack(rack)
+    UTILS.save_view(view)
+    UTILS.merge_views()
+
+
+class ViewGenerationTest(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.data_dir_patch = mock.patch.object(app_paths, 'DATA_DIR', self.data_dir + os.sep)
+        self.data_dir_patch.start()
+        self.log_file = os.path.join(self.data_dir, 'handler.log')
+
+    def tearDown(self):
+        self.data_dir_patch.stop()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def make_updates_handler(self):
+        handler = UpdatesHandler({'concertim': mock.MagicMock()}, self.log_file, 'DEBUG')
+        handler.scheduler = mock.MagicMock()
+        return handler
+
+    def test_updates_handler_keeps_unchanged_view(self):
+        publish_view()
+        generation = UTILS.get_view_generation()
+        handler = self.make_updates_handler()
+        handler.run_process()
+        first_view = handler.view
+        handler.run_process()
+        self.assertIs(handler.view, first_view)
+        #-- Nothing was created, so nothing was published
+        self.assertEqual(UTILS.get_view_generation(), generation)
+
+        publish_view()
+        handler.run_process()
+        self.assertIsNot(handler.view, first_view)
+
+    def test_updates_handler_reloads_after_publishing_new_ids(self):
+        publish_view(new_rack=True)
+        generation = UTILS.get_view_generation()
+        handler = self.make_updates_handler()
+        handler.clients['concertim'].create_rack.return_value = {'id': 20}
+        handler.run_process()
+        self.assertEqual(UTILS.get_view_generation(), generation + 1)
+        handler.run_process()
+        self.assertIn((20, 'stack-2', 'sub-2'), handler.view.racks)
+        self.assertEqual(handler._view_generation, generation + 1)
+
+    def test_billing_handler_keeps_unchanged_view(self):
+        publish_view()
+        clients = {
+            'concertim': mock.MagicMock(metrics_workers=4),
+            'cloud': mock.MagicMock(),
+            'billing': mock.MagicMock()
+        }
+        handler = BillingHandler(clients, self.log_file, 'DEBUG')
+        handler.scheduler = mock.MagicMock()
+        with mock.patch.object(handler, 'pull_cost_data'):
+            handler.run_process()
+            first_view = handler.view
+            handler.run_process()
+            self.assertIs(handler.view, first_view)
+            publish_view()
+            handler.run_process()
+            self.assertIsNot(handler.view, first_view)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Checks ConcertimView.delete_stale_items keeps the same keys as the previous
+# nested-loop implementation on randomised views, and handles the partial key
+# matching several complete keys that the previous implementation raised on.
+#
+#   python -m pytest conser/tests/test_view_stale_items.py
+
+# Local Imports
+from conser.modules.clients.concertim.objects.view import ConcertimView
+
+# Py Packages
+import random
+import unittest
+from types import SimpleNamespace
+
+STALE_ITEM_DICTS = ['templates', 'devices', 'racks', 'users']
+RANDOM_VIEWS = 500
+
+def legacy_check_partial_match(partial_tup, complete_tup):
+    # Previous ConcertimView._check_partial_match implementation
+    matching = False
+    for i in range(len(partial_tup)):
+        if not partial_tup[i]:
+            continue
+        elif partial_tup[i] != complete_tup[i]:
+            break
+        elif partial_tup[i] == complete_tup[i]:
+            matching = True
+            break
+    return matching
+
+def legacy_delete_stale_items(view):
+    # Previous ConcertimView.delete_stale_items implementation
+    for dict_name in STALE_ITEM_DICTS:
+        partials = [k for k in getattr(view, dict_name) if not all(k)]
+        completes = [k for k in getattr(view, dict_name) if all(k)]
+        for partial_id_tup in partials:
+            for complete_id_tup in completes:
+                if legacy_check_partial_match(partial_id_tup, complete_id_tup):
+                    del getattr(view, dict_name)[partial_id_tup]
+
+def make_view(keys_by_dict):
+    view = ConcertimView()
+    for dict_name, keys in keys_by_dict.items():
+        setattr(view, dict_name, {k: SimpleNamespace(id=k) for k in keys})
+    view.rebuild_search_indices()
+    return view
+
+def random_keys(rand):
+    # As in a real view, an ID is only held by one complete key per position.
+    # Each ID in a partial key is missing, taken from a complete key, or one no complete key has.
+    keys_by_dict = {}
+    for dict_name in STALE_ITEM_DICTS:
+        tup_len = 2 if dict_name == 'devices' else 3
+        id_pools = [rand.sample(range(1, 100), 40) for position in range(tup_len)]
+        completes = [tuple(id_pools[p].pop() for p in range(tup_len)) for i in range(rand.randint(0, 15))]
+        keys = set(completes)
+        for i in range(rand.randint(0, 15)):
+            source = rand.choice(completes) if completes else None
+            partial = []
+            for p in range(tup_len):
+                kind = rand.random()
+                if kind < 0.4:
+                    partial.append(None)
+                elif source and kind < 0.6:
+                    partial.append(source[p])
+                elif completes and kind < 0.8:
+                    partial.append(rand.choice(completes)[p])
+                else:
+                    partial.append(id_pools[p].pop())
+            partial[rand.randrange(tup_len)] = None
+            keys.add(tuple(partial))
+        keys_by_dict[dict_name] = list(keys)
+    return keys_by_dict
+
+def surviving_keys(view):
+    return {dict_name: set(getattr(view, dict_name)) for dict_name in STALE_ITEM_DICTS}
+
+
+class DeleteStaleItemsTest(unittest.TestCase):
+    def test_matches_legacy_on_random_views(self):
+        rand = random.Random(1234)
+        for i in range(RANDOM_VIEWS):
+            keys_by_dict = random_keys(rand)
+            legacy_view = make_view(keys_by_dict)
+            legacy_delete_stale_items(legacy_view)
+            view = make_view(keys_by_dict)
+            view.delete_stale_items()
+            self.assertEqual(surviving_keys(view), surviving_keys(legacy_view), keys_by_dict)
+
+    def test_partial_matching_several_complete_keys(self):
+        keys_by_dict = {
+            'templates': [],
+            'devices': [],
+            'racks': [(1, None, None), (1, 'a', 'x'), (1, 'b', 'y'), (None, 'c', None)],
+            'users': []
+        }
+        legacy_view = make_view(keys_by_dict)
+        with self.assertRaises(KeyError):
+            legacy_delete_stale_items(legacy_view)
+        view = make_view(keys_by_dict)
+        view.delete_stale_items()
+        self.assertEqual(set(view.racks), {(1, 'a', 'x'), (1, 'b', 'y'), (None, 'c', None)})
+        self.assertEqual(view.search('rack', 1, 'concertim'), view.racks[(1, 'a', 'x')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Local Imports
+from conser.utils.service_logger import create_logger
+
+# Py Packages
+import time
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+class ClientCache(object):
+    """
+    Thread-safe LRU cache of built clients, e.g. authenticated cloud clients
+    keyed by the credential set they were built with.
+
+    An entry expires `ttl` seconds after it was built, or earlier if the
+    client has a get_token_ttl() method reporting that its auth token is about
+    to expire. Evicted clients are only dropped, not disconnected, as another
+    request may still be using them.
+    """
+    # Entries are rebuilt when their token has less than this many seconds left
+    TOKEN_EXPIRY_MARGIN = 60
+
+    def __init__(self, max_size, ttl, log_file, log_level):
+        self._LOG_LEVEL = log_level
+        self._LOG_FILE = log_file
+        self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl)
+        # {key: (client, expiry)}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(*parts):
+        # Hashed so credentials are not kept in the key
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, key, build_func):
+        """
+        Return the cached client for key, calling build_func to create it if it
+        is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._is_valid(entry):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                self.__LOGGER.debug(f"Cached client {key[:12]} expired - rebuilding")
+                del self._entries[key]
+            self.misses += 1
+        #-- Built outside the lock so a slow authentication doesn't block other keys
+        client = build_func()
+        with self._lock:
+            self._entries[key] = (client, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return client
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+    def _is_valid(self, entry):
+        client, expiry = entry
+        if time.monotonic() >= expiry:
+            return False
+        get_token_ttl = getattr(client, 'get_token_ttl', None)
+        if get_token_ttl:
+            try:
+                token_ttl = get_token_ttl()
+            except Exception as e:
+                self.__LOGGER.debug(f"Could not check client token expiry - {type(e).__name__} - {e}")
+                return False
+            if token_ttl is not None and token_ttl < ClientCache.TOKEN_EXPIRY_MARGIN:
+                return False
+        return True
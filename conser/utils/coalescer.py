@@ -0,0 +1,93 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Local Imports
+from conser.utils.service_logger import create_logger
+
+# Py Packages
+import time
+
+class EventCoalescer(object):
+    """
+    Groups events by key and releases each group as one, once no new event for
+    the group has arrived for `window` seconds, or `max_latency` seconds after
+    the group's first event - whichever is sooner.
+
+    Each event carries an item (deduplicated within its group) and a token
+    (kept for every event, e.g. a message delivery tag to ack on release).
+    """
+    def __init__(self, window, max_latency, log_file, log_level):
+        self._LOG_LEVEL = log_level
+        self._LOG_FILE = log_file
+        self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
+        self.window = float(window)
+        self.max_latency = max(float(max_latency), self.window)
+        # {key: {'first': , 'last': , 'items': {item: None}, 'tokens': []}}
+        self._groups = {}
+        # Stats
+        self.raw_events = 0
+        self.released_groups = 0
+
+    def add(self, key, item, token=None):
+        now = time.monotonic()
+        group = self._groups.setdefault(key, {'first': now, 'last': now, 'items': {}, 'tokens': []})
+        group['last'] = now
+        group['items'][item] = None
+        group['tokens'].append(token)
+        self.raw_events += 1
+
+    def pop_due(self, force=False):
+        """
+        Remove and return the groups that are ready as a list of (key, items, tokens).
+        If force is True every group is returned.
+        """
+        now = time.monotonic()
+        due = []
+        for key, group in list(self._groups.items()):
+            if force or now - group['last'] >= self.window or now - group['first'] >= self.max_latency:
+                del self._groups[key]
+                due.append((key, list(group['items']), group['tokens']))
+        if due:
+            self.released_groups += len(due)
+            self.__LOGGER.debug(f"Released {len(due)} group(s) - {self.raw_events} raw events coalesced into {self.released_groups} groups so far")
+        return due
+
+    def clear(self):
+        self._groups = {}
+
+    def pending_tokens(self):
+        return sum(len(group['tokens']) for group in self._groups.values())
+
+    def stats(self):
+        return {
+            'raw_events': self.raw_events,
+            'released_groups': self.released_groups,
+            'pending_groups': len(self._groups),
+            'coalesce_ratio': self.raw_events / self.released_groups if self.released_groups else 0.0
+        }
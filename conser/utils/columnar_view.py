@@ -0,0 +1,211 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Local Imports
+import conser.exceptions as EXCP
+
+# Py Packages
+import mmap
+import struct
+
+# COLUMNAR VIEW FORMAT
+# A read-only copy of the view's IDs and cost fields for consumers that do not need
+# the full ConcertimView object graph.
+#
+#   header | table directory | fixed width rows for each table | string heap
+#
+# 'str' columns are stored in a row as (offset, length) into the string heap,
+# a length of NULL_LENGTH means the value was None. All string values are returned
+# as str, regardless of their type in the view.
+# 'int' columns (Concertim IDs) are returned as int, so they match the view's ID tuples,
+# a value of NULL_INT means the value was None.
+COLUMNAR_VIEW_MAGIC = b"CONSERCV"
+COLUMNAR_VIEW_VERSION = 2
+# magic, version, generation, heap offset, heap length
+COLUMNAR_VIEW_HEADER = struct.Struct("<8sHQQQ")
+# row count, rows offset
+COLUMNAR_TABLE_ENTRY = struct.Struct("<IQ")
+NULL_LENGTH = 0xFFFFFFFF
+NULL_INT = -2**63
+COLUMN_FORMATS = {
+    'str': 'II',
+    'int': 'q',
+    'float': 'd'
+}
+# table_name: [(column_name, column_kind, getter)]
+TABLES = {
+    'devices': [
+        ('concertim_id', 'int', lambda d: d.id[0]),
+        ('cloud_id', 'str', lambda d: d.id[1]),
+        ('type', 'str', lambda d: d.type),
+        ('rack_concertim_id', 'int', lambda d: d.rack_id_tuple[0] if d.rack_id_tuple else None),
+        ('rack_cloud_id', 'str', lambda d: d.rack_id_tuple[1] if d.rack_id_tuple else None),
+        ('cost', 'float', lambda d: d.cost)
+    ],
+    'racks': [
+        ('concertim_id', 'int', lambda r: r.id[0]),
+        ('cloud_id', 'str', lambda r: r.id[1]),
+        ('billing_id', 'str', lambda r: r.id[2]),
+        ('team_concertim_id', 'int', lambda r: r.team_id_tuple[0] if r.team_id_tuple else None),
+        ('team_cloud_id', 'str', lambda r: r.team_id_tuple[1] if r.team_id_tuple else None),
+        ('team_billing_id', 'str', lambda r: r.team_id_tuple[2] if r.team_id_tuple else None),
+        ('cost', 'float', lambda r: r.cost)
+    ],
+    'teams': [
+        ('concertim_id', 'int', lambda t: t.id[0]),
+        ('cloud_id', 'str', lambda t: t.id[1]),
+        ('billing_id', 'str', lambda t: t.id[2]),
+        ('cost', 'float', lambda t: t.cost),
+        ('credits', 'float', lambda t: t.credits)
+    ]
+}
+
+def _row_struct(table_name):
+    return struct.Struct('<' + ''.join(COLUMN_FORMATS[kind] for name, kind, getter in TABLES[table_name]))
+
+def build_columnar_view(view, generation):
+    """
+    Return the bytes of the columnar copy of the given ConcertimView.
+    """
+    heap = bytearray()
+    heap_refs = {}
+
+    def heap_ref(value):
+        if value is None:
+            return (0, NULL_LENGTH)
+        encoded = str(value).encode('utf-8')
+        if encoded not in heap_refs:
+            heap_refs[encoded] = (len(heap), len(encoded))
+            heap.extend(encoded)
+        return heap_refs[encoded]
+
+    tables_bytes = {}
+    for table_name, columns in TABLES.items():
+        row_struct = _row_struct(table_name)
+        rows = bytearray()
+        for obj in getattr(view, table_name).values():
+            row_values = []
+            for name, kind, getter in columns:
+                value = getter(obj)
+                if kind == 'str':
+                    row_values.extend(heap_ref(value))
+                elif kind == 'int':
+                    row_values.append(NULL_INT if value is None else int(value))
+                else:
+                    row_values.append(float(value or 0.0))
+            rows.extend(row_struct.pack(*row_values))
+        tables_bytes[table_name] = (len(getattr(view, table_name)), bytes(rows))
+
+    offset = COLUMNAR_VIEW_HEADER.size + COLUMNAR_TABLE_ENTRY.size * len(TABLES)
+    directory = bytearray()
+    body = bytearray()
+    for table_name in TABLES:
+        count, rows = tables_bytes[table_name]
+        directory.extend(COLUMNAR_TABLE_ENTRY.pack(count, offset))
+        body.extend(rows)
+        offset += len(rows)
+    header = COLUMNAR_VIEW_HEADER.pack(COLUMNAR_VIEW_MAGIC, COLUMNAR_VIEW_VERSION, generation, offset, len(heap))
+    return header + bytes(directory) + bytes(body) + bytes(heap)
+
+
+class ColumnarViewReader(object):
+    """
+    Read-only, memory-mapped access to a columnar view file.
+
+    Rows are decoded on iteration and only the requested columns are read
+    from the string heap.
+    """
+    def __init__(self, location):
+        self._file = open(location, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.generation, self._heap_offset, self._heap_length = COLUMNAR_VIEW_HEADER.unpack_from(self._mmap, 0)
+            if magic != COLUMNAR_VIEW_MAGIC:
+                raise Exception("File is not a columnar view")
+            if version != COLUMNAR_VIEW_VERSION:
+                raise Exception(f"Unsupported columnar view version {version}")
+            self._tables = {}
+            for i, table_name in enumerate(TABLES):
+                count, rows_offset = COLUMNAR_TABLE_ENTRY.unpack_from(self._mmap, COLUMNAR_VIEW_HEADER.size + i * COLUMNAR_TABLE_ENTRY.size)
+                self._tables[table_name] = (count, rows_offset)
+        except Exception as e:
+            self.close()
+            raise e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def count(self, table_name):
+        return self._tables[table_name][0]
+
+    def iter_rows(self, table_name, columns):
+        """
+        Yield a tuple of the requested column values for every row in the table.
+        """
+        if table_name not in self._tables:
+            raise EXCP.InvalidArguments(f"table_name:{table_name}")
+        column_names = [name for name, kind, getter in TABLES[table_name]]
+        unknown_columns = [c for c in columns if c not in column_names]
+        if unknown_columns:
+            raise EXCP.InvalidArguments(f"columns:{unknown_columns}")
+        count, rows_offset = self._tables[table_name]
+        row_struct = _row_struct(table_name)
+        # Map each requested column to its position(s) in the unpacked row
+        positions = []
+        field = 0
+        for name, kind, getter in TABLES[table_name]:
+            if name in columns:
+                positions.append((columns.index(name), kind, field))
+            field += 2 if kind == 'str' else 1
+        positions.sort()
+        for i in range(count):
+            row = row_struct.unpack_from(self._mmap, rows_offset + i * row_struct.size)
+            yield tuple(self._decode(kind, row, field) for index, kind, field in positions)
+
+    def close(self):
+        if getattr(self, '_mmap', None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _decode(self, kind, row, field):
+        if kind == 'int':
+            return None if row[field] == NULL_INT else row[field]
+        if kind != 'str':
+            return row[field]
+        offset, length = row[field], row[field + 1]
+        if length == NULL_LENGTH:
+            return None
+        start = self._heap_offset + offset
+        return self._mmap[start:start + length].decode('utf-8')
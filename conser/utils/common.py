@@ -31,13 +31,39 @@
 import conser.app_definitions as app_paths
 import conser.exceptions as EXCP
 from conser.modules.clients.concertim.objects.view import ConcertimView
+from conser.utils.columnar_view import build_columnar_view, ColumnarViewReader
+from conser.utils.resync_channel import send_resync_notification, ResyncListener
 
 # Py Packages
 import pickle
 import os
+import json
 import yaml
+import fcntl
+import struct
+from contextlib import contextmanager
 from datetime import datetime
 
+# VIEW SNAPSHOT FORMAT
+# The published view is a fixed size header followed by the pickled ConcertimView
+VIEW_SNAPSHOT_FILE = "view.snapshot"
+VIEW_SNAPSHOT_MAGIC = b"CONSERVW"
+VIEW_SNAPSHOT_VERSION = 1
+# magic, version, generation, rack/device/user/template/team counts, payload length
+VIEW_SNAPSHOT_HEADER = struct.Struct("<8sHQIIIIIQ")
+# Read-only columnar copy of the view's IDs and costs, published alongside the snapshot
+COLUMNAR_VIEW_FILE = "view.columns"
+# Cloud IDs of instances whose cached metric info is stale, one per line
+METRICS_INVALIDATION_FILE = "metrics_cache.invalidate"
+# Cloud objects waiting for a targeted resync, one JSON object per line
+RESYNC_QUEUE_FILE = "resync.queue"
+# Valid resync target types - 'full' requests a full sync
+RESYNC_TARGET_TYPES = ['server', 'stack', 'project', 'full']
+# Unix datagram socket the sync process listens on for resync notifications
+RESYNC_SOCKET_FILE = "resync.sock"
+# Last cost values the billing process sent to Concertim/the billing app
+BILLING_LEDGER_FILE = "billing_ledger.json"
+
 # HELPERS
 def load_config():
     CONFIG_FILE = app_paths.CONFIG_FILE
@@ -61,108 +87,258 @@ def load_config():
     return config
 
 def load_view():
-    view_location = app_paths.DATA_DIR + "view.pickle"
+    view, generation = load_view_if_changed(None)
+    return view
+
+def load_view_if_changed(last_generation):
+    """
+    Load the published view snapshot, unless its generation matches last_generation.
+
+    Returns a tuple of (view, generation) - view is None if the snapshot has not changed
+    since last_generation was loaded, so the caller can keep using its current view.
+    """
+    view_location = app_paths.DATA_DIR + VIEW_SNAPSHOT_FILE
     try:
-        with open(view_location, 'rb') as pkl_file:
-            view = pickle.load(pkl_file)
-        return view
+        with open(view_location, 'rb') as snap_file:
+            header = _read_view_header(snap_file)
+            if last_generation is not None and header['generation'] == last_generation:
+                return None, header['generation']
+            view = pickle.loads(snap_file.read(header['payload_length']))
+        return view, header['generation']
     except Exception as e:
         raise Exception(f"Could not load view from {view_location} -> {e}")
 
-def merge_views():
-    view_location = app_paths.DATA_DIR
-    # Load initial view - use current view file; if none exists make an empty view
+def open_columnar_view():
+    """
+    Open the published columnar view for read-only access to view IDs and costs.
+    The returned ColumnarViewReader should be closed when finished with.
+    """
+    columns_location = app_paths.DATA_DIR + COLUMNAR_VIEW_FILE
     try:
-        latest_view = load_view()
+        return ColumnarViewReader(columns_location)
     except Exception as e:
-        latest_view = ConcertimView()
-    # Sort all files in acending order (when merging this will make the most recent view applied last)
-    sorted_files = sorted(os.listdir(view_location))
-    # Loop over all files
-    for file_name in sorted_files:
-        # Grab only view files with a timestamp
-        if file_name.endswith('.pickle') and '~' in file_name:
-            # Merge
-            print(f"Merging {file_name}")
-            with open(view_location+file_name, 'rb') as t_view:
-                temp_view = pickle.load(t_view)
-                if temp_view:
-                    latest_view.merge(temp_view)
-            os.remove(view_location+file_name)
+        raise Exception(f"Could not open columnar view from {columns_location} -> {e}")
 
-    # Delete any stale items from the view after merge
-    latest_view.delete_stale_items()
-    
-    # Save merged view as new view.pickle
-    save_location = app_paths.DATA_DIR + "view.pickle"
+def get_view_generation():
+    """
+    Return the generation counter of the published view snapshot, or None if there isn't one.
+    Only the fixed size header is read.
+    """
+    view_location = app_paths.DATA_DIR + VIEW_SNAPSHOT_FILE
+    if not os.path.exists(view_location):
+        return None
     try:
-        if not os.path.exists(save_location):
-            os.mknod(save_location, mode = 0o660)
-        with open(save_location, 'wb') as pkl_file:
-            pickle.dump(latest_view, pkl_file, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(view_location, 'rb') as snap_file:
+            return _read_view_header(snap_file)['generation']
     except Exception as e:
-        raise Exception(f"Could not save View after merging to {save_location} -> {e}")
+        raise Exception(f"Could not read view header from {view_location} -> {e}")
+
+def merge_views():
+    view_location = app_paths.DATA_DIR
+    with _view_lock():
+        # Load initial view - use current view file; if none exists make an empty view
+        try:
+            latest_view = load_view()
+        except Exception as e:
+            latest_view = ConcertimView()
+        # Sort all files in acending order (the most recent view is last)
+        # As of v1.2.0 merging overwrites all data, so only the most recent view needs loading
+        view_files = sorted(f for f in os.listdir(view_location) if f.endswith('.pickle') and '~' in f)
+        if view_files:
+            print(f"Merging {view_files[-1]}")
+            with open(view_location + view_files[-1], 'rb') as t_view:
+                temp_view = pickle.load(t_view)
+            if temp_view:
+                latest_view.merge(temp_view)
+        for file_name in view_files:
+            try:
+                os.remove(view_location + file_name)
+            except FileNotFoundError:
+                pass
+
+        # Delete any stale items from the view after merge
+        latest_view.delete_stale_items()
+
+        # Publish merged view as the next snapshot generation
+        save_location = view_location + VIEW_SNAPSHOT_FILE
+        try:
+            last_generation = get_view_generation()
+        except Exception as e:
+            last_generation = None
+        generation = 1 if last_generation is None else last_generation + 1
+        try:
+            payload = pickle.dumps(latest_view, protocol=pickle.HIGHEST_PROTOCOL)
+            header = VIEW_SNAPSHOT_HEADER.pack(
+                VIEW_SNAPSHOT_MAGIC,
+                VIEW_SNAPSHOT_VERSION,
+                generation,
+                len(latest_view.racks),
+                len(latest_view.devices),
+                len(latest_view.users),
+                len(latest_view.templates),
+                len(latest_view.teams),
+                len(payload)
+            )
+            _write_file_atomic(save_location, header + payload)
+        except Exception as e:
+            raise Exception(f"Could not save View after merging to {save_location} -> {e}")
+        columns_location = view_location + COLUMNAR_VIEW_FILE
+        try:
+            _write_file_atomic(columns_location, build_columnar_view(latest_view, generation))
+        except Exception as e:
+            raise Exception(f"Could not save columnar View after merging to {columns_location} -> {e}")
 
 def save_view(view_to_save):
-    view_location = app_paths.DATA_DIR + "view~" + datetime.now().strftime("%Y-%m-%d-%H-%M-%S") + ".pickle"
+    view_location = app_paths.DATA_DIR + "view~" + datetime.now().strftime("%Y-%m-%d-%H-%M-%S-%f") + ".pickle"
     try:
-        if not os.path.exists(view_location):
-            os.mknod(view_location, mode = 0o660)
-        with open(view_location, 'wb') as pkl_file:
-            pickle.dump(view_to_save, pkl_file, protocol=pickle.HIGHEST_PROTOCOL)
+        _write_file_atomic(view_location, pickle.dumps(view_to_save, protocol=pickle.HIGHEST_PROTOCOL))
     except Exception as e:
         raise Exception(f"Could not save View to {view_location} -> {e}")
 
-def create_resync_flag():
-    flag_location = app_paths.DATA_DIR + "resync.flag"
+def _read_view_header(snap_file):
+    raw_header = snap_file.read(VIEW_SNAPSHOT_HEADER.size)
+    if len(raw_header) != VIEW_SNAPSHOT_HEADER.size:
+        raise Exception("View snapshot header is truncated")
+    magic, version, generation, racks, devices, users, templates, teams, payload_length = VIEW_SNAPSHOT_HEADER.unpack(raw_header)
+    if magic != VIEW_SNAPSHOT_MAGIC:
+        raise Exception("File is not a view snapshot")
+    if version != VIEW_SNAPSHOT_VERSION:
+        raise Exception(f"Unsupported view snapshot version {version}")
+    return {
+        'version': version,
+        'generation': generation,
+        'counts': {
+            'racks': racks,
+            'devices': devices,
+            'users': users,
+            'templates': templates,
+            'teams': teams
+        },
+        'payload_length': payload_length
+    }
+
+def _write_file_atomic(location, data):
+    # Write to a temp file in the same dir then rename over the target,
+    # so readers only ever see the old or the new complete file
+    temp_location = f"{location}.{os.getpid()}.tmp"
+    fd = os.open(temp_location, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o660)
     try:
-        if not os.path.exists(flag_location):
-            os.mknod(flag_location, mode = 0o660)
-        with open(flag_location, 'wb') as flag_file:
-            flag_file.write(b" ")
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_location, location)
     except Exception as e:
-        raise Exception(f"Could not create flag file at {flag_location} -> {e}")
+        if os.path.exists(temp_location):
+            os.remove(temp_location)
+        raise e
 
-def check_resync_flag():
-    flag_location = app_paths.DATA_DIR + "resync.flag"
+@contextmanager
+def _view_lock():
+    with _data_lock("view.lock"):
+        yield
+
+@contextmanager
+def _data_lock(lock_name):
+    lock_location = app_paths.DATA_DIR + lock_name
+    with open(lock_location, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def invalidate_metrics_cache(resource_id):
+    invalidation_location = app_paths.DATA_DIR + METRICS_INVALIDATION_FILE
     try:
-        if os.path.exists(flag_location):
-            return True
-        return False
+        with _data_lock("metrics_cache.lock"):
+            with open(invalidation_location, 'a') as invalidation_file:
+                invalidation_file.write(f"{resource_id}\n")
     except Exception as e:
-        raise Exception(f"Could not check for flag file at {flag_location} -> {e}")
+        raise Exception(f"Could not write metrics cache invalidation to {invalidation_location} -> {e}")
 
-def delete_resync_flag():
-    flag_location = app_paths.DATA_DIR + "resync.flag"
+def pop_metrics_cache_invalidations():
+    """
+    Return the set of resource IDs invalidated since the last call, and clear them.
+    """
+    invalidation_location = app_paths.DATA_DIR + METRICS_INVALIDATION_FILE
     try:
-        if os.path.exists(flag_location):
-            os.remove(flag_location)
+        with _data_lock("metrics_cache.lock"):
+            if not os.path.exists(invalidation_location):
+                return set()
+            with open(invalidation_location, 'r') as invalidation_file:
+                resource_ids = {line.strip() for line in invalidation_file if line.strip()}
+            os.remove(invalidation_location)
+            return resource_ids
     except Exception as e:
-        raise Exception(f"Could not delete flag file at {flag_location} -> {e}")
+        raise Exception(f"Could not read metrics cache invalidations from {invalidation_location} -> {e}")
 
-def create_resync_hold():
-    hold_location = app_paths.DATA_DIR + "resync.hold"
+def load_billing_ledger():
+    """
+    Return the saved billing ledger, or an empty ledger if none has been saved.
+    """
+    ledger_location = app_paths.DATA_DIR + BILLING_LEDGER_FILE
+    if not os.path.exists(ledger_location):
+        return {}
     try:
-        if not os.path.exists(hold_location):
-            os.mknod(hold_location, mode = 0o660)
-        with open(hold_location, 'wb') as hold_file:
-            hold_file.write(b" ")
+        with open(ledger_location, 'r') as ledger_file:
+            return json.load(ledger_file)
     except Exception as e:
-        raise Exception(f"Could not create hold file at {hold_location} -> {e}")
+        raise Exception(f"Could not load billing ledger from {ledger_location} -> {e}")
 
-def check_resync_hold():
-    hold_location = app_paths.DATA_DIR + "resync.hold"
+def save_billing_ledger(ledger):
+    ledger_location = app_paths.DATA_DIR + BILLING_LEDGER_FILE
     try:
-        if os.path.exists(hold_location):
-            return True
-        return False
+        _write_file_atomic(ledger_location, json.dumps(ledger).encode('utf-8'))
     except Exception as e:
-        raise Exception(f"Could not check for hold file at {hold_location} -> {e}")
+        raise Exception(f"Could not save billing ledger to {ledger_location} -> {e}")
 
-def delete_resync_hold():
-    hold_location = app_paths.DATA_DIR + "resync.hold"
+def queue_resync_target(target_type, target_id=None):
+    if target_type not in RESYNC_TARGET_TYPES:
+        raise EXCP.InvalidArguments(f"target_type:{target_type}")
+    queue_location = app_paths.DATA_DIR + RESYNC_QUEUE_FILE
     try:
-        if os.path.exists(hold_location):
-            os.remove(hold_location)
+        with _data_lock("resync_queue.lock"):
+            with open(queue_location, 'a') as queue_file:
+                queue_file.write(json.dumps({'type': target_type, 'id': target_id}) + "\n")
+                queue_file.flush()
+                os.fsync(queue_file.fileno())
     except Exception as e:
-        raise Exception(f"Could not delete hold file at {hold_location} -> {e}")
+        raise Exception(f"Could not write resync target to {queue_location} -> {e}")
+
+def pop_resync_targets():
+    """
+    Return the list of (target_type, target_id) queued since the last call, and clear them.
+    Duplicate targets are only returned once, in the order they were first queued.
+    """
+    queue_location = app_paths.DATA_DIR + RESYNC_QUEUE_FILE
+    try:
+        with _data_lock("resync_queue.lock"):
+            if not os.path.exists(queue_location):
+                return []
+            targets = {}
+            with open(queue_location, 'r') as queue_file:
+                for line in queue_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Partially written line - the sync it belonged to is lost, so ask for a full one
+                        entry = {'type': 'full', 'id': None}
+                    targets[(entry['type'], entry['id'])] = None
+            os.remove(queue_location)
+            return list(targets)
+    except Exception as e:
+        raise Exception(f"Could not read resync targets from {queue_location} -> {e}")
+
+def request_resync(target_type='full', target_id=None):
+    """
+    Queue a resync target and wake the sync process.
+    """
+    queue_resync_target(target_type, target_id)
+    notify_resync()
+
+def notify_resync():
+    send_resync_notification(app_paths.DATA_DIR + RESYNC_SOCKET_FILE)
+
+def create_resync_listener(log_file, log_level):
+    return ResyncListener(app_paths.DATA_DIR + RESYNC_SOCKET_FILE, log_file, log_level)
@@ -0,0 +1,118 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Local Imports
+from conser.utils.service_logger import create_logger
+
+# Py Packages
+import os
+import errno
+import select
+import socket
+
+# Any datagram is a notification - the contents are not used
+RESYNC_NOTIFICATION = b"resync"
+
+def send_resync_notification(location):
+    """
+    Wake the process listening on the resync channel at location.
+
+    Never blocks - if nothing is listening the notification is dropped, the
+    work it refers to is already in the durable resync queue and is picked up
+    by the next sync. If the channel is full, a wakeup is already pending.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(RESYNC_NOTIFICATION, socket.MSG_DONTWAIT, location)
+    except (FileNotFoundError, ConnectionRefusedError, BlockingIOError):
+        pass
+    except OSError as e:
+        if e.errno not in (errno.ENOBUFS, errno.EAGAIN):
+            raise Exception(f"Could not send resync notification to {location} -> {e}")
+    finally:
+        sock.close()
+
+
+class ResyncListener(object):
+    """
+    Receiving end of the resync notification channel, a Unix datagram socket.
+
+    All notifications that arrive before wait() returns are coalesced, so a
+    burst of events causes a single wakeup.
+    """
+    def __init__(self, location, log_file, log_level):
+        self._LOG_LEVEL = log_level
+        self._LOG_FILE = log_file
+        self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
+        self.location = location
+        # Stats
+        self.wakeups = 0
+        self.notifications = 0
+        #-- A socket file left by a previous listener can't be bound to
+        if os.path.exists(self.location):
+            os.remove(self.location)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            self._sock.bind(self.location)
+            os.chmod(self.location, 0o660)
+            self._sock.setblocking(False)
+        except Exception as e:
+            self._sock.close()
+            raise Exception(f"Could not create resync channel at {self.location} -> {e}")
+        self.__LOGGER.debug(f"Listening for resync notifications on {self.location}")
+
+    def wait(self, timeout):
+        """
+        Block until a notification arrives or timeout seconds pass.
+        Returns True if woken by a notification.
+        """
+        readable, _, _ = select.select([self._sock], [], [], max(0.0, timeout))
+        if not readable:
+            return False
+        count = self._drain()
+        self.wakeups += 1
+        self.notifications += count
+        self.__LOGGER.debug(f"Woken by {count} resync notification(s) - {self.notifications} notifications in {self.wakeups} wakeups")
+        return True
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            if os.path.exists(self.location):
+                os.remove(self.location)
+
+    def _drain(self):
+        count = 0
+        while True:
+            try:
+                self._sock.recv(len(RESYNC_NOTIFICATION))
+            except BlockingIOError:
+                return count
+            count += 1
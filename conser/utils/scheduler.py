@@ -0,0 +1,89 @@
+"""
+==============================================================================
+ Copyright (C) 2024-present Alces Flight Ltd.
+
+ This file is part of Concertim Openstack Service.
+
+ This program and the accompanying materials are made available under
+ the terms of the Eclipse Public License 2.0 which is available at
+ <https://www.eclipse.org/legal/epl-2.0>, or alternative license
+ terms made available by Alces Flight Ltd - please direct inquiries
+ about licensing to licensing@alces-flight.com.
+
+ Concertim Openstack Service is distributed in the hope that it will be useful, but
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, EITHER EXPRESS OR
+ IMPLIED INCLUDING, WITHOUT LIMITATION, ANY WARRANTIES OR CONDITIONS
+ OF TITLE, NON-INFRINGEMENT, MERCHANTABILITY OR FITNESS FOR A
+ PARTICULAR PURPOSE. See the Eclipse Public License 2.0 for more
+ details.
+
+ You should have received a copy of the Eclipse Public License 2.0
+ along with Concertim Openstack Service. If not, see:
+
+  https://opensource.org/licenses/EPL-2.0
+
+ For more information on Concertim Openstack Service, please visit:
+ https://github.com/openflighthpc/concertim-openstack-service
+==============================================================================
+"""
+
+# Local Imports
+from conser.utils.service_logger import create_logger
+
+# Py Packages
+import time
+
+class IntervalScheduler(object):
+    """
+    Runs a loop on fixed ticks of the monotonic clock, instead of sleeping
+    for a full interval after the work is done.
+
+    Ticks are at start + n*interval, so the time spent doing the work is not
+    added to the period. If the work overruns one or more ticks, the missed
+    ticks are either skipped (wait for the next tick on the schedule) or
+    coalesced (run once straight away, then carry on from the schedule).
+    """
+    def __init__(self, interval, log_file, log_level, coalesce_overruns=False):
+        self._LOG_LEVEL = log_level
+        self._LOG_FILE = log_file
+        self.__LOGGER = create_logger(__name__, self._LOG_FILE, self._LOG_LEVEL)
+        self.interval = float(interval)
+        self.coalesce_overruns = coalesce_overruns
+        # Tick stats
+        self.ticks = 0
+        self.overruns = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._next_tick = time.monotonic()
+
+    def wait_for_next_tick(self):
+        """
+        Block until the next tick is due and return the lag (seconds between
+        when the tick was due and when it started).
+        """
+        self._next_tick += self.interval
+        now = time.monotonic()
+        if now >= self._next_tick:
+            #-- Work overran - count every tick that has already passed
+            passed = int((now - self._next_tick) // self.interval) + 1
+            self.overruns += passed
+            #-- Coalesce - run now for the latest passed tick, Skip - wait for the next tick
+            skipped = passed - 1 if self.coalesce_overruns else passed
+            self._next_tick += skipped * self.interval
+            self.__LOGGER.warning(f"Work overran the {self.interval}s interval by {passed} tick(s) - total overruns {self.overruns}")
+        delay = self._next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.ticks += 1
+        self.last_lag = max(0.0, time.monotonic() - self._next_tick)
+        self.max_lag = max(self.max_lag, self.last_lag)
+        self.__LOGGER.debug(f"Tick {self.ticks} - lag {self.last_lag:.3f}s - max lag {self.max_lag:.3f}s - overruns {self.overruns}")
+        return self.last_lag
+
+    def stats(self):
+        return {
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'last_lag': self.last_lag,
+            'max_lag': self.max_lag
+        }